@@ -98,8 +98,10 @@ module RocketTile(
 
 `ifdef MULTICORE
   integer i;
+  integer j;
   integer fd;
   integer c;
+  reg [31:0] cov_word;
   reg [8*100:1] out;
   initial begin
     if ($value$plusargs("OUT=%s", out)) begin
@@ -108,329 +110,444 @@ module RocketTile(
   end
   always @(posedge clock) begin
     if (cov_restore) begin
-      fd = $fopen({out, "/covmap/ptw.PTW_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/ptw.PTW_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "ptw.PTW_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          ptw.PTW_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            ptw.PTW_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/dcacheArb.HellaCacheArbiter_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/dcacheArb.HellaCacheArbiter_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "dcacheArb.HellaCacheArbiter_cov");
       else begin
-        for (i=0; i<2; i=i+1) begin
-          c = $fgetc(fd);
-          dcacheArb.HellaCacheArbiter_cov[i] = c[0];
+        for (i=0; i<2; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<2; j=j+1)
+            dcacheArb.HellaCacheArbiter_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/tlMasterXbar.TLXbar_7_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/tlMasterXbar.TLXbar_7_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "tlMasterXbar.TLXbar_7_cov");
       else begin
-        for (i=0; i<8; i=i+1) begin
-          c = $fgetc(fd);
-          tlMasterXbar.TLXbar_7_cov[i] = c[0];
+        for (i=0; i<8; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<8; j=j+1)
+            tlMasterXbar.TLXbar_7_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/dcache.DCache_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/dcache.DCache_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "dcache.DCache_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          dcache.DCache_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            dcache.DCache_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/dcache.pma_checker.TLB_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/dcache.pma_checker.TLB_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "dcache.pma_checker.TLB_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          dcache.pma_checker.TLB_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            dcache.pma_checker.TLB_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/dcache.tlb.TLB_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/dcache.tlb.TLB_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "dcache.tlb.TLB_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          dcache.tlb.TLB_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            dcache.tlb.TLB_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/core.Rocket_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/core.Rocket_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "core.Rocket_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          core.Rocket_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            core.Rocket_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/core.csr.CSRFile_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/core.csr.CSRFile_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "core.csr.CSRFile_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          core.csr.CSRFile_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            core.csr.CSRFile_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/core.div.MulDiv_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/core.div.MulDiv_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "core.div.MulDiv_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          core.div.MulDiv_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            core.div.MulDiv_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/core.ibuf.IBuf_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/core.ibuf.IBuf_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "core.ibuf.IBuf_cov");
       else begin
-        for (i=0; i<4; i=i+1) begin
-          c = $fgetc(fd);
-          core.ibuf.IBuf_cov[i] = c[0];
+        for (i=0; i<4; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<4; j=j+1)
+            core.ibuf.IBuf_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.FPU_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.FPU_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.FPU_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.FPU_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            fpuOpt.FPU_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov");
       else begin
-        for (i=0; i<32; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov[i] = c[0];
+        for (i=0; i<32; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<32; j=j+1)
+            fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.ifpu.IntToFP_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.ifpu.IntToFP_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.ifpu.IntToFP_cov");
       else begin
-        for (i=0; i<32; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.ifpu.IntToFP_cov[i] = c[0];
+        for (i=0; i<32; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<32; j=j+1)
+            fpuOpt.ifpu.IntToFP_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov");
       else begin
-        for (i=0; i<32; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov[i] = c[0];
+        for (i=0; i<32; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<32; j=j+1)
+            fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.fpmu.FPToFP_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.fpmu.FPToFP_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.fpmu.FPToFP_cov");
       else begin
-        for (i=0; i<128; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.fpmu.FPToFP_cov[i] = c[0];
+        for (i=0; i<128; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<128; j=j+1)
+            fpuOpt.fpmu.FPToFP_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov");
       else begin
-        for (i=0; i<2; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov[i] = c[0];
+        for (i=0; i<2; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<2; j=j+1)
+            fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.fpiu.FPToInt_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.fpiu.FPToInt_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.fpiu.FPToInt_cov");
       else begin
-        for (i=0; i<32; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.fpiu.FPToInt_cov[i] = c[0];
+        for (i=0; i<32; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<32; j=j+1)
+            fpuOpt.fpiu.FPToInt_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/fpuOpt.sfma.fma.MulAddRecFNPipe_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/fpuOpt.sfma.fma.MulAddRecFNPipe_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "fpuOpt.sfma.fma.MulAddRecFNPipe_cov");
       else begin
-        for (i=0; i<2; i=i+1) begin
-          c = $fgetc(fd);
-          fpuOpt.sfma.fma.MulAddRecFNPipe_cov[i] = c[0];
+        for (i=0; i<2; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<2; j=j+1)
+            fpuOpt.sfma.fma.MulAddRecFNPipe_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/frontend.Frontend_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/frontend.Frontend_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "frontend.Frontend_cov");
       else begin
-        for (i=0; i<64; i=i+1) begin
-          c = $fgetc(fd);
-          frontend.Frontend_cov[i] = c[0];
+        for (i=0; i<64; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<64; j=j+1)
+            frontend.Frontend_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/frontend.icache.ICache_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/frontend.icache.ICache_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "frontend.icache.ICache_cov");
       else begin
-        for (i=0; i<64; i=i+1) begin
-          c = $fgetc(fd);
-          frontend.icache.ICache_cov[i] = c[0];
+        for (i=0; i<64; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<64; j=j+1)
+            frontend.icache.ICache_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/frontend.fq.ShiftQueue_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/frontend.fq.ShiftQueue_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "frontend.fq.ShiftQueue_cov");
       else begin
-        for (i=0; i<2; i=i+1) begin
-          c = $fgetc(fd);
-          frontend.fq.ShiftQueue_cov[i] = c[0];
+        for (i=0; i<2; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<2; j=j+1)
+            frontend.fq.ShiftQueue_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/frontend.tlb.TLB_1_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/frontend.tlb.TLB_1_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "frontend.tlb.TLB_1_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          frontend.tlb.TLB_1_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            frontend.tlb.TLB_1_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
-      fd = $fopen({out, "/covmap/frontend.btb.BTB_cov.dat"}, "r");
+      fd = $fopen({out, "/covmap/frontend.btb.BTB_cov.dat"}, "rb");
       if (fd == 0)
         $display("No saved %s, starting from zero", "frontend.btb.BTB_cov");
       else begin
-        for (i=0; i<1048576; i=i+1) begin
-          c = $fgetc(fd);
-          frontend.btb.BTB_cov[i] = c[0];
+        for (i=0; i<1048576; i=i+32) begin
+          c = $fread(cov_word, fd);
+          for (j=0; j<32 && i+j<1048576; j=j+1)
+            frontend.btb.BTB_cov[i+j] = cov_word[(3-j/8)*8 + j%8];
         end
         $fclose(fd);
       end
     end
     if (cov_store) begin
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/ptw.PTW_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", ptw.PTW_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/ptw.PTW_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = ptw.PTW_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcacheArb.HellaCacheArbiter_cov.dat"}, "w");
-      for (i=0; i<2; i=i+1)
-        $fwrite(fd, "%0b", dcacheArb.HellaCacheArbiter_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcacheArb.HellaCacheArbiter_cov.dat"}, "wb");
+      for (i=0; i<2; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<2; j=j+1)
+          cov_word[j] = dcacheArb.HellaCacheArbiter_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/tlMasterXbar.TLXbar_7_cov.dat"}, "w");
-      for (i=0; i<8; i=i+1)
-        $fwrite(fd, "%0b", tlMasterXbar.TLXbar_7_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/tlMasterXbar.TLXbar_7_cov.dat"}, "wb");
+      for (i=0; i<8; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<8; j=j+1)
+          cov_word[j] = tlMasterXbar.TLXbar_7_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.DCache_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", dcache.DCache_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.DCache_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = dcache.DCache_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.pma_checker.TLB_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", dcache.pma_checker.TLB_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.pma_checker.TLB_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = dcache.pma_checker.TLB_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.tlb.TLB_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", dcache.tlb.TLB_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/dcache.tlb.TLB_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = dcache.tlb.TLB_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.Rocket_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", core.Rocket_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.Rocket_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = core.Rocket_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.csr.CSRFile_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", core.csr.CSRFile_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.csr.CSRFile_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = core.csr.CSRFile_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.div.MulDiv_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", core.div.MulDiv_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.div.MulDiv_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = core.div.MulDiv_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.ibuf.IBuf_cov.dat"}, "w");
-      for (i=0; i<4; i=i+1)
-        $fwrite(fd, "%0b", core.ibuf.IBuf_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/core.ibuf.IBuf_cov.dat"}, "wb");
+      for (i=0; i<4; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<4; j=j+1)
+          cov_word[j] = core.ibuf.IBuf_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.FPU_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.FPU_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.FPU_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = fpuOpt.FPU_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov.dat"}, "w");
-      for (i=0; i<32; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov.dat"}, "wb");
+      for (i=0; i<32; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<32; j=j+1)
+          cov_word[j] = fpuOpt.divSqrt_1.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_1_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.ifpu.IntToFP_cov.dat"}, "w");
-      for (i=0; i<32; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.ifpu.IntToFP_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.ifpu.IntToFP_cov.dat"}, "wb");
+      for (i=0; i<32; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<32; j=j+1)
+          cov_word[j] = fpuOpt.ifpu.IntToFP_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov.dat"}, "w");
-      for (i=0; i<32; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov.dat"}, "wb");
+      for (i=0; i<32; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<32; j=j+1)
+          cov_word[j] = fpuOpt.divSqrt.divSqrtRecFNToRaw.divSqrtRawFN.DivSqrtRawFN_small_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.fpmu.FPToFP_cov.dat"}, "w");
-      for (i=0; i<128; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.fpmu.FPToFP_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.fpmu.FPToFP_cov.dat"}, "wb");
+      for (i=0; i<128; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<128; j=j+1)
+          cov_word[j] = fpuOpt.fpmu.FPToFP_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov.dat"}, "w");
-      for (i=0; i<2; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov.dat"}, "wb");
+      for (i=0; i<2; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<2; j=j+1)
+          cov_word[j] = fpuOpt.dfma.fma.MulAddRecFNPipe_1_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.fpiu.FPToInt_cov.dat"}, "w");
-      for (i=0; i<32; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.fpiu.FPToInt_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.fpiu.FPToInt_cov.dat"}, "wb");
+      for (i=0; i<32; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<32; j=j+1)
+          cov_word[j] = fpuOpt.fpiu.FPToInt_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.sfma.fma.MulAddRecFNPipe_cov.dat"}, "w");
-      for (i=0; i<2; i=i+1)
-        $fwrite(fd, "%0b", fpuOpt.sfma.fma.MulAddRecFNPipe_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/fpuOpt.sfma.fma.MulAddRecFNPipe_cov.dat"}, "wb");
+      for (i=0; i<2; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<2; j=j+1)
+          cov_word[j] = fpuOpt.sfma.fma.MulAddRecFNPipe_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.Frontend_cov.dat"}, "w");
-      for (i=0; i<64; i=i+1)
-        $fwrite(fd, "%0b", frontend.Frontend_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.Frontend_cov.dat"}, "wb");
+      for (i=0; i<64; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<64; j=j+1)
+          cov_word[j] = frontend.Frontend_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.icache.ICache_cov.dat"}, "w");
-      for (i=0; i<64; i=i+1)
-        $fwrite(fd, "%0b", frontend.icache.ICache_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.icache.ICache_cov.dat"}, "wb");
+      for (i=0; i<64; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<64; j=j+1)
+          cov_word[j] = frontend.icache.ICache_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.fq.ShiftQueue_cov.dat"}, "w");
-      for (i=0; i<2; i=i+1)
-        $fwrite(fd, "%0b", frontend.fq.ShiftQueue_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.fq.ShiftQueue_cov.dat"}, "wb");
+      for (i=0; i<2; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<2; j=j+1)
+          cov_word[j] = frontend.fq.ShiftQueue_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.tlb.TLB_1_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", frontend.tlb.TLB_1_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.tlb.TLB_1_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = frontend.tlb.TLB_1_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
-      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.btb.BTB_cov.dat"}, "w");
-      for (i=0; i<1048576; i=i+1)
-        $fwrite(fd, "%0b", frontend.btb.BTB_cov[i]);
+      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/frontend.btb.BTB_cov.dat"}, "wb");
+      for (i=0; i<1048576; i=i+32) begin
+        cov_word = 0;
+        for (j=0; j<32 && i+j<1048576; j=j+1)
+          cov_word[j] = frontend.btb.BTB_cov[i+j];
+        $fwrite(fd, "%u", cov_word);
+      end
       $fclose(fd);
     end
   end
@@ -7,7 +7,7 @@ from cocotb.regression import TestFactory
 
 from src.utils import save_file
 from src.env_parser import envParser
-from src.multicore_manager import proc_state, procManager
+from src.multicore_manager import proc_state, procManager, workerChannel, wait_channels
 
 from Fuzzer import Run
 from Minimizer import Minimize
@@ -35,6 +35,65 @@ def wait_check(proc_pid_arr: list, manager: procManager):
 
     return idx
 
+def kill_workers(proc_pid_arr: list, end_pid: int):
+    for pid in proc_pid_arr:
+        if pid and pid != end_pid:
+            os.kill(pid, signal.SIGKILL)
+
+# Returns the channel of the new worker in the child, None in the coordinator
+def spawn_worker(proc_num: int, proc_pid_arr: list, channels: dict):
+    channel = workerChannel()
+
+    child_pid = os.fork()
+    if child_pid == 0:
+        for other in channels.values():
+            other.close()
+        channel.worker_side()
+        return channel
+
+    channel.coordinator_side()
+    channels[proc_num] = channel
+    proc_pid_arr[proc_num] = child_pid
+    return None
+
+def coordinate(proc_pid_arr: list, channels: dict, manager: procManager, num_batch: int):
+    while channels:
+        for proc_num in wait_channels(channels):
+            channel = channels[proc_num]
+            state = channel.recv()
+
+            if state is None:
+                channel.close()
+                channels.pop(proc_num)
+                end_pid, exit_code = os.waitpid(proc_pid_arr[proc_num], 0)
+                proc_pid_arr[proc_num] = 0
+
+                if exit_code != 0:
+                    print('[DifuzzRTL] Child {} died! exit_code: {}'.format(proc_num, exit_code))
+
+                # Died before being told to stop, restart it on a new batch
+                if num_batch:
+                    num_batch -= 1
+                    print('[DifuzzRTL] Multicore Fuzzing Restart, Thread [{}]'.format(proc_num))
+                    worker = spawn_worker(proc_num, proc_pid_arr, channels)
+                    if worker:
+                        return (proc_num, worker)
+                continue
+
+            if state != proc_state.NORMAL:
+                print('[DifuzzRTL] Child {} is in abnormal state {}!'.
+                      format(proc_num, proc_state.tpe[state]))
+                kill_workers(proc_pid_arr, proc_pid_arr[proc_num])
+                exit(-1)
+
+            run = num_batch > 0
+            if run:
+                num_batch -= 1
+                print('[DifuzzRTL] Multicore Fuzzing Next Batch, Thread [{}]'.format(proc_num))
+            channel.send(run)
+
+    return None
+
 #########################
 
 """ Fuzzer entry """
@@ -51,6 +110,10 @@ parser.add_option('debug', 0, 'Debugging?')
 parser.add_option('minimize', 0, 'Minimizing?')
 parser.add_option('prob_intr', 0, 'Probability of asserting interrupt')
 parser.add_option('no_guide', 0, 'Only random testing?')
+parser.add_option('isa_batch', 1, 'The number of tests run per ISA simulator process')
+parser.add_option('pipeline', 0, 'Compile and run ISA simulation during RTL simulation? (overrides isa_batch)')
+parser.add_option('persistent', 0, 'Keep the multicore workers alive across batches?')
+parser.add_option('tl_seed', 0, 'Seed the TileLink source/sink order from the test data?')
 
 parser.print_help()
 parser.parse_option()
@@ -60,10 +123,13 @@ record = parser.arg_map['record'][0]
 multicore = min(parser.arg_map['multicore'][0], 40)
 minimize = parser.arg_map['minimize'][0]
 parser.arg_map.pop('minimize', None)
+persistent = parser.arg_map['persistent'][0]
+parser.arg_map.pop('persistent', None)
 
 toplevel = parser.arg_map['toplevel'][0]
 template = parser.arg_map['template'][0]
 debug = parser.arg_map['debug'][0]
+tl_seed = parser.arg_map['tl_seed'][0]
 
 
 if not os.path.isdir(out):
@@ -74,14 +140,12 @@ if not os.path.isdir(out + '/mismatch'):
     os.makedirs(out + '/mismatch/sim_input')
     os.makedirs(out + '/mismatch/elf')
     os.makedirs(out + '/mismatch/asm')
-    os.makedirs(out + '/mismatch/hex')
 
 if not os.path.isdir(out + '/illegal'):
     os.makedirs(out + '/illegal')
     os.makedirs(out + '/illegal/sim_input')
     os.makedirs(out + '/illegal/elf')
     os.makedirs(out + '/illegal/asm')
-    os.makedirs(out + '/illegal/hex')
 
 if not os.path.isdir(out + '/corpus'):
     os.makedirs(out + '/corpus')
@@ -101,6 +165,7 @@ if not multicore:
         factory.add_option('template', [template])
         factory.add_option('out', [out])
         factory.add_option('debug', [debug])
+        factory.add_option('tl_seed', [tl_seed])
 
     else:
         factory = TestFactory(Run)
@@ -139,7 +204,28 @@ else:
     num_running = 0
     proc_num = 0
     proc_pid_arr = [ 0 for i in range(multicore) ] # proc_num as index
-    for i in range(num_batch * multicore):
+
+    # Persistent workers keep their simulator, mutator and corpus across
+    # batches, the coordinator hands out batches through the channels
+    channel = None
+    channels = {}
+    num_worker = multicore if persistent and num_batch else 0
+    for proc_num in range(num_worker):
+        print('[DifuzzRTL] Multicore Fuzzing Batch [{}], Thread [{}]'.format(proc_num, proc_num))
+
+        channel = spawn_worker(proc_num, proc_pid_arr, channels)
+        if channel:
+            parent = False
+            break
+
+    if persistent and parent:
+        worker = coordinate(proc_pid_arr, channels, manager,
+                            num_batch * multicore - num_worker)
+        if worker:
+            parent = False
+            (proc_num, channel) = worker
+
+    for i in range(0 if persistent else num_batch * multicore):
         proc_num = proc_pid_arr.index(0)
         print('[DifuzzRTL] Multicore Fuzzing Batch [{}], Thread [{}]'.format(i, proc_num))
 
@@ -158,20 +244,17 @@ else:
 
 
     if not parent:
-        manager.P('covMap')
-        fd = open(out + '/cov_log_{}.txt'.format(date), 'r')
-        lines = fd.readlines()
-        fd.close()
-        last_tuple = lines[-1].split('\t')
-        manager.V('covMap')
-
+        (start_iter, start_cov) = manager.read_cov_log()
         cov_log = out + '/coverage/cov_log_{}_{}.txt'.format(date, proc_num)
-        start_iter = int(last_tuple[1])
-        start_cov = int(last_tuple[2])
 
         factory = TestFactory(Run)
         parser.register_option(factory)
-        factory.add_option('num_iter', [num_iter])
+        if channel:
+            factory.add_option('num_iter', [num_batch * multicore * num_iter])
+            factory.add_option('batch_iter', [num_iter])
+            factory.add_option('channel', [channel])
+        else:
+            factory.add_option('num_iter', [num_iter])
         factory.add_option('cov_log', [cov_log])
         factory.add_option('manager', [manager])
         factory.add_option('proc_num', [proc_num])
@@ -206,4 +289,5 @@ else:
             factory.add_option('num_cores', [multicore])
             factory.add_option('proc_num', [i])
             factory.add_option('debug', [debug])
+            factory.add_option('tl_seed', [tl_seed])
             factory.generate_tests()
@@ -1,11 +1,12 @@
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 
 from cocotb.decorators import coroutine
 from RTLSim.host import ILL_MEM, SUCCESS, TIME_OUT, ASSERTION_FAIL
 
 from src.utils import *
-from src.multicore_manager import proc_state
+from src.multicore_manager import proc_state, COV_MERGE_PERIOD
 
 
 @coroutine
@@ -13,7 +14,8 @@ def Run(dut, toplevel,
         num_iter=1, template='Template', in_file=None,
         out='output', record=False, cov_log=None,
         multicore=0, manager=None, proc_num=0, start_time=0, start_iter=0, start_cov=0,
-        prob_intr=0, no_guide=False, debug=False):
+        prob_intr=0, no_guide=False, isa_batch=1, pipeline=False,
+        batch_iter=0, channel=None, tl_seed=False, debug=False):
 
     assert toplevel in ['RocketTile', 'BoomTile' ], \
         '{} is not toplevel'.format(toplevel)
@@ -21,15 +23,31 @@ def Run(dut, toplevel,
     random.seed(time.time() * (proc_num + 1))
 
     (mutator, preprocessor, isaHost, rtlHost, checker) = \
-        setup(dut, toplevel, template, out, proc_num, debug, no_guide=no_guide)
+        setup(dut, toplevel, template, out, proc_num, debug, no_guide=no_guide,
+              tl_seed=tl_seed)
 
     if in_file: num_iter = 1
 
     stop = [ proc_state.NORMAL ]
+    batch = []
+    slot = 0
+
+    # Pipelined, compile and ISA simulation of the next input (in the other
+    # slot) run in the worker while the RTL simulation of this one runs
+    executor = None
+    pending = None
+    if pipeline and not in_file:
+        executor = ThreadPoolExecutor(max_workers=1)
+
     mNum = 0
     cNum = 0
     iNum = 0
     last_coverage = 0
+    last_merge = -COV_MERGE_PERIOD
+
+    # A persistent worker runs batches of batch_iter until the coordinator stops it
+    batch_start = 0
+    stopped = False
 
     debug_print('[DifuzzRTL] Start Fuzzing', debug)
 
@@ -39,28 +57,69 @@ def Run(dut, toplevel,
     for it in range(num_iter):
         debug_print('[DifuzzRTL] Iteration [{}]'.format(it), debug)
 
+        if channel and it - batch_start == batch_iter:
+            rtlHost.stop_clock()
+            yield manager.cov_store(dut, proc_num)
+            manager.store_covmap(proc_num, start_time, start_iter, batch_iter)
+
+            channel.report(proc_state.NORMAL)
+            if not channel.next_batch():
+                stopped = True
+                break
+
+            (start_iter, _) = manager.read_cov_log()
+            start_iter += 1
+            batch_start = it
+
         if multicore:
             if it == 0:
                 mutator.update_corpus(out + '/corpus', 1000)
             elif it % 1000 == 0:
                 mutator.update_corpus(out + '/corpus')
 
-        assert_intr = False
-        if random.random() < prob_intr:
-            assert_intr = True
+        if executor:
+            if not pending:
+                pending = submit_test(executor, mutator, preprocessor, isaHost,
+                                      prob_intr, out, proc_num, slot)
+
+            (slot, sim_input, data, assert_intr, future) = pending
+            (isa_input, rtl_input, symbols, isa_ret) = future.result()
+
+            pending = None
+            if it + 1 < num_iter:
+                pending = submit_test(executor, mutator, preprocessor, isaHost,
+                                      prob_intr, out, proc_num, slot ^ 1)
+        elif isa_batch > 1 and not in_file:
+            if not batch:
+                batch = prepare_batch(mutator, preprocessor, isaHost,
+                                      min(isa_batch, num_iter - it), prob_intr, out, proc_num)
+
+            (slot, sim_input, data, assert_intr,
+             isa_input, rtl_input, symbols, isa_ret) = batch.pop(0)
+        else:
+            assert_intr = False
+            if random.random() < prob_intr:
+                assert_intr = True
+
+            if in_file: (sim_input, data, assert_intr) = mutator.read_siminput(in_file)
+            else: (sim_input, data) = mutator.get(assert_intr)
 
-        if in_file: (sim_input, data, assert_intr) = mutator.read_siminput(in_file)
-        else: (sim_input, data) = mutator.get(assert_intr)
+            (isa_input, rtl_input, symbols) = preprocessor.process(sim_input, data, assert_intr)
+            isa_ret = None
 
         if debug:
             print('[DifuzzRTL] Fuzz Instructions')
             for inst, INT in zip(sim_input.get_insts(), sim_input.ints + [0]):
                 print('{:<50}{:04b}'.format(inst, INT))
 
-        (isa_input, rtl_input, symbols) = preprocessor.process(sim_input, data, assert_intr)
-
         if isa_input and rtl_input:
-            ret = run_isa_test(isaHost, isa_input, stop, out, proc_num)
+            if isa_ret is None:
+                ret = run_isa_test(isaHost, isa_input, stop, out, proc_num)
+            else:
+                ret = isa_ret
+                if ret == proc_state.ERR_ISA_ASSERT:
+                    stop[0] = ret
+
             if ret == proc_state.ERR_ISA_TIMEOUT: continue
             elif ret == proc_state.ERR_ISA_ASSERT: break
 
@@ -71,10 +130,15 @@ def Run(dut, toplevel,
                 break
 
             if assert_intr and ret == SUCCESS:
-                (intr_prv, epc) = checker.check_intr(symbols)
+                (intr_prv, epc) = checker.check_intr(symbols, rtl_input.signature)
                 if epc != 0:
                     preprocessor.write_isa_intr(isa_input, rtl_input, epc)
-                    ret = run_isa_test(isaHost, isa_input, stop, out, proc_num, True)
+                    if executor:
+                        # Queued behind the worker, so only one ISA simulation runs at a time
+                        ret = executor.submit(run_isa_test, isaHost, isa_input, stop,
+                                              out, proc_num, True, slot).result()
+                    else:
+                        ret = run_isa_test(isaHost, isa_input, stop, out, proc_num, True, slot)
                     if ret == proc_state.ERR_ISA_TIMEOUT: continue
                     elif ret == proc_state.ERR_ISA_ASSERT: break
                 else: continue
@@ -82,14 +146,14 @@ def Run(dut, toplevel,
             cause = '-'
             match = False
             if ret == SUCCESS:
-                match = checker.check(symbols)
+                match = checker.check(symbols, rtl_input.signature, isa_input.sigfile)
             elif ret == ILL_MEM:
                 match = True
                 debug_print('[DifuzzRTL] Memory access outside DRAM -- {}'. \
                             format(iNum), debug, True)
                 if record:
                     save_mismatch(out, proc_num, out + '/illegal',
-                                  sim_input, data, iNum)
+                                  sim_input, data, iNum, slot)
                 iNum += 1
 
             if not match or ret not in [SUCCESS, ILL_MEM]:
@@ -99,7 +163,7 @@ def Run(dut, toplevel,
 
                 if record:
                     save_mismatch(out, proc_num, out + '/mismatch',
-                                  sim_input, data, mNum)
+                                  sim_input, data, mNum, slot)
 
                 mNum += 1
                 if ret == TIME_OUT: cause = 'Timeout'
@@ -109,16 +173,26 @@ def Run(dut, toplevel,
                 debug_print('[DifuzzRTL] Bug -- {} [{}]'. \
                             format(mNum, cause), debug, not match or (ret != SUCCESS))
 
-            if coverage > last_coverage:
+            new_cov = coverage > last_coverage
+            if new_cov and multicore and it - last_merge >= COV_MERGE_PERIOD:
+                # Only keep the input if no worker has covered its points yet,
+                # the dump is costly so in between the local coverage decides
+                rtlHost.stop_clock()
+                yield manager.cov_store(dut, proc_num)
+                new_cov = manager.merge_covmap(proc_num) > 0
+                last_coverage = coverage
+                last_merge = it
+
+            if new_cov:
                 if multicore:
                     cNum = manager.read_num('cNum')
                     manager.write_num('cNum', cNum + 1)
 
                 if record:
                     save_file(cov_log, 'a', '{:<10}\t{:<10}\t{:<10}\n'.
-                              format(time.time() - start_time, start_iter + it,
+                              format(time.time() - start_time, start_iter + it - batch_start,
                                      start_cov + coverage))
-                    sim_input.save(out + '/corpus/id_{}.si'.format(cNum))
+                    mutator.save_corpus(out + '/corpus', cNum, sim_input)
 
                 cNum += 1
                 mutator.add_corpus(sim_input)
@@ -131,12 +205,22 @@ def Run(dut, toplevel,
             # Compile failed
             break
 
+    if executor:
+        executor.shutdown(wait=True)
+
+    # cov_store drives the clock by itself
+    rtlHost.stop_clock()
+
     if multicore:
-        save_err(out, proc_num, manager, stop[0])
+        save_err(out, proc_num, manager, stop[0], slot)
         manager.set_state(proc_num, stop[0])
 
     debug_print('[DifuzzRTL] Stop Fuzzing', debug)
 
-    if multicore:
+    if multicore and not stopped:
         yield manager.cov_store(dut, proc_num)
-        manager.store_covmap(proc_num, start_time, start_iter, num_iter)
+        manager.store_covmap(proc_num, start_time, start_iter,
+                             batch_iter if channel else num_iter)
+
+    if channel and not stopped:
+        channel.report(stop[0])
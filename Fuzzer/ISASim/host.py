@@ -3,15 +3,17 @@ import os
 import subprocess
 
 class isaInput():
-    def __init__(self, binary, intrfile):
+    def __init__(self, binary, intrfile, sigfile=None):
         self.binary = binary
         self.intrfile = intrfile
+        self.sigfile = sigfile
 
 class rvISAhost():
-    def __init__(self, spike, spike_args, isa_sigfile, debug=False):
+    def __init__(self, spike, spike_args, isa_sigfile, batch_file=None, debug=False):
         self.spike = spike
         self.spike_args = spike_args
         self.isa_sigfile = isa_sigfile
+        self.batch_file = batch_file
 
         self.debug= debug
 
@@ -19,13 +21,55 @@ class rvISAhost():
         if self.debug:
             print(message)
 
+    def get_sigfile(self, isa_input: isaInput):
+        if isa_input.sigfile:
+            return isa_input.sigfile
+        return self.isa_sigfile
+
     def run_test(self, isa_input: isaInput, assert_intr=False):
         binary = isa_input.binary
         if assert_intr: intr = [ '--intr={}'.format(isa_input.intrfile) ]
         else: intr = []
 
         args = [ self.spike ] + self.spike_args + intr + \
-            [ '+signature={}'.format(self.isa_sigfile), binary ]
+            [ '+signature={}'.format(self.get_sigfile(isa_input)), binary ]
 
         self.debug_print('[ISAHost] Start ISA simulation')
         return subprocess.call(args)
+
+    # Run all isa_inputs in one spike process (spike --batch), timeout in ms.
+    # Returns spike's exit code per input, None if the input timed out.
+    # If spike itself dies, the input it was running gets spike's return code
+    # and the rest of the batch is run by a new spike.
+    def run_batch(self, isa_inputs: list, timeout, assert_intr=False):
+        assert self.batch_file, 'ISA host has no batch file'
+
+        rets = []
+        while len(rets) < len(isa_inputs):
+            fd = open(self.batch_file, 'w')
+            for isa_input in isa_inputs[len(rets):]:
+                line = '{} {}'.format(isa_input.binary, self.get_sigfile(isa_input))
+                if assert_intr: line += ' {}'.format(isa_input.intrfile)
+                fd.write(line + '\n')
+            fd.close()
+
+            args = [ self.spike ] + self.spike_args + \
+                [ '--batch={}'.format(self.batch_file), '--timeout={}'.format(timeout) ]
+
+            self.debug_print('[ISAHost] Start ISA simulation, batch of {}'.
+                             format(len(isa_inputs) - len(rets)))
+            proc = subprocess.run(args, stdout=subprocess.PIPE, universal_newlines=True)
+
+            for line in proc.stdout.splitlines():
+                if not line.startswith('[batch] '):
+                    continue
+
+                ret = line.split()[2]
+                if ret == 'timeout': rets.append(None)
+                else: rets.append(int(ret))
+
+            if len(rets) < len(isa_inputs):
+                if proc.returncode: rets.append(proc.returncode)
+                else: rets.append(-1)
+
+        return rets
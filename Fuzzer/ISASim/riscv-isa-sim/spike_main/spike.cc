@@ -5,6 +5,7 @@
 #include "remote_bitbang.h"
 #include "cachesim.h"
 #include "extension.h"
+#include "dts.h"
 #include <dlfcn.h>
 #include <fesvr/option_parser.h>
 #include <stdio.h>
@@ -13,6 +14,11 @@
 #include <string>
 #include <memory>
 #include <fstream>
+#include <sstream>
+#include <signal.h>
+#include <unistd.h>
+#include <sys/time.h>
+#include <sys/wait.h>
 #include "../VERSION"
 
 #include <map>
@@ -24,6 +30,10 @@ static void help(int exit_code = 1)
   fprintf(stderr, "usage: spike [host options] <target program> [target options]\n");
   fprintf(stderr, "Host Options:\n");
   fprintf(stderr, "  -intr=<path>          Pseudo interrupt file specifying the pc to assert interrupt\n");
+  fprintf(stderr, "  --batch=<path>        Run every test listed in <path>, one per line as\n");
+  fprintf(stderr, "                          <elf> <signature file> [<interrupt file>]\n");
+  fprintf(stderr, "                          and print \"[batch] <n> <exit code|timeout>\" per test\n");
+  fprintf(stderr, "  --timeout=<ms>        Wall-clock limit for each test in batch mode [default 0, none]\n");
   fprintf(stderr, "  -p<n>                 Simulate <n> processors [default 1]\n");
   fprintf(stderr, "  -m<n>                 Provide <n> MiB of target memory [default 2048]\n");
   fprintf(stderr, "  -m<a:m,b:n,...>       Provide memory regions of size m and n bytes\n");
@@ -213,6 +223,92 @@ static std::vector<std::pair<reg_t, mem_t*>> make_mems(const char* arg)
   return res;
 }
 
+struct batch_test_t
+{
+  std::string elf;
+  std::string sig_file;
+  std::string intr;
+};
+
+static std::vector<batch_test_t> read_batch(const char *filename)
+{
+  std::ifstream in(filename, std::ios::in);
+  std::string line;
+
+  std::vector<batch_test_t> tests;
+
+  while(std::getline(in, line)) {
+    std::istringstream fields(line);
+    batch_test_t test;
+
+    if (!(fields >> test.elf >> test.sig_file))
+      continue;
+    fields >> test.intr;
+
+    tests.push_back(test);
+  }
+
+  return tests;
+}
+
+// Each test runs in a forked child, so the memories, devices and harts start
+// out as in a fresh spike without paying for exec and shared library loading.
+// The child arms a real-time timer, an expired test dies of SIGALRM.
+static int run_batch(const std::vector<batch_test_t>& tests, unsigned long timeout,
+                     std::function<int(const std::map<reg_t, reg_t>&,
+                                       const std::vector<std::string>&)> run_sim,
+                     const std::vector<std::string>& htif_args)
+{
+  for (size_t n = 0; n < tests.size(); n++) {
+    const batch_test_t& test = tests[n];
+
+    fflush(stdout);
+    fflush(stderr);
+
+    pid_t pid = fork();
+    if (pid < 0) {
+      perror("fork");
+      return -1;
+    }
+
+    if (pid == 0) {
+      if (timeout) {
+        struct itimerval timer = {};
+        timer.it_value.tv_sec = timeout / 1000;
+        timer.it_value.tv_usec = (timeout % 1000) * 1000;
+        setitimer(ITIMER_REAL, &timer, NULL);
+      }
+
+      std::map<reg_t, reg_t> intrs;
+      if (!test.intr.empty() && check_file_exists(test.intr.c_str()))
+        intrs = read_intr(test.intr.c_str(), 0);
+
+      std::vector<std::string> args(htif_args);
+      args.push_back("+signature=" + test.sig_file);
+      args.push_back(test.elf);
+
+      int return_code = run_sim(intrs, args);
+
+      fflush(stdout);
+      fflush(stderr);
+      _exit(return_code);
+    }
+
+    int status;
+    while (waitpid(pid, &status, 0) < 0);
+
+    if (WIFEXITED(status))
+      printf("[batch] %zu %d\n", n, WEXITSTATUS(status));
+    else if (WTERMSIG(status) == SIGALRM)
+      printf("[batch] %zu timeout\n", n);
+    else
+      printf("[batch] %zu %d\n", n, -WTERMSIG(status));
+  }
+
+  fflush(stdout);
+  return 0;
+}
+
 int main(int argc, char** argv)
 {
   bool debug = false;
@@ -223,6 +319,8 @@ int main(int argc, char** argv)
   bool dtb_enabled = true;
   bool real_time_clint = false;
   const char* intr = NULL;
+  const char* batch = NULL;
+  unsigned long timeout = 0;
   std::map<reg_t, reg_t> intrs;
   reg_t intr_offset, intr_size;
   size_t nprocs = 1;
@@ -323,6 +421,8 @@ int main(int argc, char** argv)
   parser.option('g', 0, 0, [&](const char* s){histogram = true;});
   parser.option('l', 0, 0, [&](const char* s){log = true;});
   parser.option(0, "intr", 1, [&](const char* s){intr = s;});
+  parser.option(0, "batch", 1, [&](const char* s){batch = s;});
+  parser.option(0, "timeout", 1, [&](const char* s){timeout = strtoul(s, 0, 0);});
   parser.option('p', 0, 1, [&](const char* s){nprocs = atoi(s);});
   parser.option('m', 0, 1, [&](const char* s){mems = make_mems(s);});
   // I wanted to use --halted, but for some reason that doesn't work.
@@ -381,7 +481,7 @@ int main(int argc, char** argv)
   if (mems.empty())
     mems = make_mems("2048");
 
-  if (!*argv1)
+  if (!*argv1 && !batch)
     help();
 
   if (intr && check_file_exists(intr)) {
@@ -415,38 +515,80 @@ int main(int argc, char** argv)
     }
   }
 
-  sim_t s(isa, priv, varch, nprocs, intrs, halted, real_time_clint,
-      initrd_start, initrd_end, bootargs, start_pc, mems, plugin_devices, htif_args,
-      std::move(hartids), dm_config, log_path, dtb_enabled, dtb_file);
-  std::unique_ptr<remote_bitbang_t> remote_bitbang((remote_bitbang_t *) NULL);
-  std::unique_ptr<jtag_dtm_t> jtag_dtm(
-      new jtag_dtm_t(&s.debug_module, dmi_rti));
-  if (use_rbb) {
-    remote_bitbang.reset(new remote_bitbang_t(rbb_port, &(*jtag_dtm)));
-    s.set_remote_bitbang(&(*remote_bitbang));
-  }
+  auto configure_sim = [&](sim_t& s) {
+    if (ic && l2) ic->set_miss_handler(&*l2);
+    if (dc && l2) dc->set_miss_handler(&*l2);
+    if (ic) ic->set_log(log_cache);
+    if (dc) dc->set_log(log_cache);
+    for (size_t i = 0; i < nprocs; i++)
+    {
+      if (ic) s.get_core(i)->get_mmu()->register_memtracer(&*ic);
+      if (dc) s.get_core(i)->get_mmu()->register_memtracer(&*dc);
+      if (extension) s.get_core(i)->register_extension(extension());
+    }
 
-  if (dump_dts) {
-    printf("%s", s.get_dts());
-    return 0;
-  }
+    s.set_debug(debug);
+    s.configure_log(log, log_commits);
+    s.set_histogram(histogram);
+  };
 
-  if (ic && l2) ic->set_miss_handler(&*l2);
-  if (dc && l2) dc->set_miss_handler(&*l2);
-  if (ic) ic->set_log(log_cache);
-  if (dc) dc->set_log(log_cache);
-  for (size_t i = 0; i < nprocs; i++)
-  {
-    if (ic) s.get_core(i)->get_mmu()->register_memtracer(&*ic);
-    if (dc) s.get_core(i)->get_mmu()->register_memtracer(&*dc);
-    if (extension) s.get_core(i)->register_extension(extension());
-  }
+  int return_code;
+  if (batch) {
+    // The device tree is the same for every test; compile it once here
+    // instead of running dtc twice in each test.
+    char dtb_name[] = "/tmp/spike_batch_XXXXXX.dtb";
+    const char* batch_dtb = dtb_file;
+    if (!batch_dtb) {
+      std::string dtb;
+      {
+        sim_t s(isa, priv, varch, nprocs, intrs, halted, real_time_clint,
+            initrd_start, initrd_end, bootargs, start_pc, mems, plugin_devices,
+            std::vector<std::string>(), hartids, dm_config, NULL, dtb_enabled, NULL);
+        dtb = dts_compile(s.get_dts());
+      }
 
-  s.set_debug(debug);
-  s.configure_log(log, log_commits);
-  s.set_histogram(histogram);
+      int fd = mkstemps(dtb_name, 4);
+      if (fd < 0 || write(fd, dtb.c_str(), dtb.size()) != (ssize_t)dtb.size()) {
+        perror("spike_batch dtb");
+        exit(1);
+      }
+      close(fd);
+      batch_dtb = dtb_name;
+    }
 
-  auto return_code = s.run();
+    auto run_sim = [&](const std::map<reg_t, reg_t>& test_intrs,
+                       const std::vector<std::string>& args) {
+      sim_t s(isa, priv, varch, nprocs, test_intrs, halted, real_time_clint,
+          initrd_start, initrd_end, bootargs, start_pc, mems, plugin_devices, args,
+          std::move(hartids), dm_config, log_path, dtb_enabled, batch_dtb);
+      configure_sim(s);
+      return s.run();
+    };
+
+    return_code = run_batch(read_batch(batch), timeout, run_sim, htif_args);
+
+    if (batch_dtb == dtb_name)
+      unlink(dtb_name);
+  } else {
+    sim_t s(isa, priv, varch, nprocs, intrs, halted, real_time_clint,
+        initrd_start, initrd_end, bootargs, start_pc, mems, plugin_devices, htif_args,
+        std::move(hartids), dm_config, log_path, dtb_enabled, dtb_file);
+    std::unique_ptr<remote_bitbang_t> remote_bitbang((remote_bitbang_t *) NULL);
+    std::unique_ptr<jtag_dtm_t> jtag_dtm(
+        new jtag_dtm_t(&s.debug_module, dmi_rti));
+    if (use_rbb) {
+      remote_bitbang.reset(new remote_bitbang_t(rbb_port, &(*jtag_dtm)));
+      s.set_remote_bitbang(&(*remote_bitbang));
+    }
+
+    if (dump_dts) {
+      printf("%s", s.get_dts());
+      return 0;
+    }
+
+    configure_sim(s);
+    return_code = s.run();
+  }
 
   for (auto& mem : mems)
     delete mem.second;
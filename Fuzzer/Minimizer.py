@@ -13,13 +13,14 @@ from src.multicore_manager import proc_state
 @coroutine
 def Minimize(dut, toplevel,
              template='Template', out='output', num_cores=1, proc_num=0,
-             debug=False):
+             tl_seed=False, debug=False):
 
     assert toplevel in ['RocketTile', 'BoomTile' ], \
         '{} is not toplevel'.format(toplevel)
 
     (mutator, preprocessor, isaHost, rtlHost, checker) = \
-        setup(dut, toplevel, template, out, proc_num, debug, minimizing=True)
+        setup(dut, toplevel, template, out, proc_num, debug, minimizing=True,
+              tl_seed=tl_seed)
 
     in_dir = out + '/mismatch/sim_input'
     stop = [ proc_state.NORMAL ]
@@ -107,15 +108,16 @@ def Minimize(dut, toplevel,
                             break
 
                         if assert_intr and ret == SUCCESS:
-                            (intr_prv, epc) = checker.check_intr(isa_input, rtl_input, epc)
+                            (intr_prv, epc) = checker.check_intr(symbols, rtl_input.signature)
                             if epc != 0:
+                                preprocessor.write_isa_intr(isa_input, rtl_input, epc)
                                 ret = run_isa_test(isaHost, isa_input, stop, out, proc_num, True)
                                 if ret == proc_state.ERR_ISA_TIMEOUT: continue
                             else: continue
 
                         match = False
                         if ret == SUCCESS:
-                            match = checker.check(symbols)
+                            match = checker.check(symbols, rtl_input.signature)
                         elif ret == ILL_MEM:
                             match = True
 
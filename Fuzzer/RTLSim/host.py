@@ -1,10 +1,12 @@
 import sys
+import struct
 import cocotb
 
 from cocotb.decorators import coroutine
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import Timer, RisingEdge, ClockCycles, First
 from reader.tile_reader import tileSrcReader
 from adapters.tile_adapter import tileAdapter
+from memory.page_memory import pageMemory
 
 SUCCESS = 0
 ASSERTION_FAIL = 1
@@ -14,15 +16,17 @@ ILL_MEM = -1
 DRAM_BASE = 0x80000000
 
 class rtlInput():
-    def __init__(self, hexfile, intrfile, data, symbols, max_cycles):
-        self.hexfile = hexfile
+    def __init__(self, image, intrfile, data, symbols, max_cycles):
+        self.image = image
         self.intrfile = intrfile
         self.data = data
         self.symbols = symbols
         self.max_cycles = max_cycles
 
+        self.signature = None
+
 class rvRTLhost():
-    def __init__(self, dut, toplevel, rtl_sig_file, debug=False):
+    def __init__(self, dut, toplevel, rtl_sig_file, debug=False, tl_seed=False):
         source_info = 'infos/' + toplevel + '_info.txt'
         reader = tileSrcReader(source_info)
 
@@ -35,17 +39,21 @@ class rvRTLhost():
 
         self.rtl_sig_file = rtl_sig_file
         self.debug = debug
+        self.tl_seed = tl_seed
 
         self.dut = dut
         self.adapter = tileAdapter(dut, port_names, monitor, self.debug)
 
+        # The clock keeps running across tests
+        self.clk_driver = None
+
     def debug_print(self, message):
         if self.debug:
             print(message)
 
     def set_bootrom(self):
         bootrom_addrs = []
-        memory = {}
+        memory = pageMemory()
         bootrom = [ 0x00000297, # auipc t0, 0x0
                     0x02028593, # addi a1, t0, 32
                     0xf1402573, # csrr a0, mhartid
@@ -77,6 +85,11 @@ class rvRTLhost():
             clock <= 0
             yield Timer(period / 2)
 
+    def stop_clock(self):
+        if self.clk_driver:
+            self.clk_driver.kill()
+            self.clk_driver = None
+
     @coroutine
     def reset(self, clock, metaReset, reset, timer=5):
         clkedge = RisingEdge(clock)
@@ -90,16 +103,17 @@ class rvRTLhost():
             yield clkedge
         reset <= 0
 
-    def save_signature(self, memory, sig_start, sig_end, data_addrs, sig_file):
-        fd = open(sig_file, 'w')
-        for i in range(sig_start, sig_end, 16):
-            dump = '{:016x}{:016x}\n'.format(memory[i+8], memory[i])
-            fd.write(dump)
-
+    def get_signature(self, memory, sig_start, sig_end, data_addrs):
+        signature = [ memory.read(sig_start, sig_end - sig_start) ]
         for (data_start, data_end) in data_addrs:
-            for i in range(data_start, data_end, 16):
-                dump = '{:016x}{:016x}\n'.format(memory[i+8], memory[i])
-                fd.write(dump)
+            signature.append(memory.read(data_start, data_end - data_start))
+
+        return b''.join(signature)
+
+    def save_signature(self, signature, sig_file):
+        fd = open(sig_file, 'w')
+        for i in range(0, len(signature), 16):
+            fd.write(signature[i:i+16][::-1].hex() + '\n')
 
         fd.close()
 
@@ -112,10 +126,6 @@ class rvRTLhost():
 
         self.debug_print('[RTLHost] Start RTL simulation')
 
-        fd = open(rtl_input.hexfile, 'r')
-        lines = fd.readlines()
-        fd.close()
-
         max_cycles = rtl_input.max_cycles
 
         symbols = rtl_input.symbols
@@ -123,16 +133,16 @@ class rvRTLhost():
         _end = symbols['_end_main']
 
         (bootrom_addrs, memory) = self.set_bootrom()
-        for (i, addr) in enumerate(range(_start, _end + 36, 8)):
-            memory[addr] = int(lines[i], 16)
+        # Only the text of the test is loaded, the rest of the image is data
+        load_len = (_end + 36 - _start + 7) // 8 * 8
+        memory.load(_start, rtl_input.image.read(_start, load_len))
 
         tohost_addr = symbols['tohost']
         sig_start = symbols['begin_signature']
         sig_end = symbols['end_signature']
 
         memory[tohost_addr] = 0
-        for addr in range(sig_start // 8 * 8, sig_end, 8):
-            memory[addr] = 0
+        memory.fill(sig_start // 8 * 8, sig_end)
 
         data = rtl_input.data
         data_addrs = []
@@ -142,9 +152,9 @@ class rvRTLhost():
             data_end = symbols['_end_data{}'.format(n)]
             data_addrs.append((data_start, data_end))
 
-            for i, addr in enumerate(range(data_start // 8 * 8, data_end // 8 * 8, 8)):
-                word = data[i + offset]
-                memory[addr] = word
+            num_words = len(range(data_start // 8 * 8, data_end // 8 * 8, 8))
+            memory.load(data_start // 8 * 8, struct.pack('<{}Q'.format(num_words),
+                                                         *data[offset:offset + num_words]))
 
             offset += (data_end - data_start) // 8
 
@@ -158,35 +168,36 @@ class rvRTLhost():
                 ints[int(pair[0], 16)] = int(pair[1], 2)
 
         clk = self.dut.clock
-        clk_driver = cocotb.fork(self.clock_gen(clk))
-        clkedge = RisingEdge(clk)
+        if not self.clk_driver:
+            self.clk_driver = cocotb.fork(self.clock_gen(clk))
 
         yield self.reset(clk, self.dut.metaReset, self.dut.reset)
 
-        self.adapter.start(memory, ints)
-        for i in range(max_cycles):
-            yield clkedge
+        # Seeded from the test's data, a saved input replays with the same
+        # TileLink id order
+        seed = None
+        if self.tl_seed:
+            seed = data[0]
+
+        self.adapter.watch_tohost(tohost_addr)
+        self.adapter.start(memory, ints, seed)
 
-            if i % 100 == 0:
-                tohost = memory[tohost_addr]
-                if tohost:
-                    break
-                else:
-                    self.adapter.probe_tohost(tohost_addr)
+        # The adapter fires tohost_written when the test writes tohost
+        yield First(self.adapter.tohost_written(), ClockCycles(clk, max_cycles))
+        timeout = not self.adapter.tohost_done()
 
         yield self.adapter.stop()
-        clk_driver.kill()
 
         # Check all the CPU's memory access operations occurs in DRAM
         mem_check = True
-        for addr in memory.keys():
-            if addr not in bootrom_addrs and addr < DRAM_BASE:
+        for addr in memory.keys_below(DRAM_BASE):
+            if addr not in bootrom_addrs:
                 mem_check = False
 
         if not mem_check:
             return (ILL_MEM, self.get_covsum())
 
-        if i == max_cycles - 1:
+        if timeout:
             self.debug_print('[RTLHost] Timeout, max_cycle={}'.format(max_cycles))
             return (TIME_OUT, self.get_covsum())
 
@@ -194,7 +205,9 @@ class rvRTLhost():
             self.debug_print('[RTLHost] Assertion Failure')
             return (ASSERTION_FAIL, self.get_covsum())
 
-        self.save_signature(memory, sig_start, sig_end, data_addrs, self.rtl_sig_file)
+        rtl_input.signature = self.get_signature(memory, sig_start, sig_end, data_addrs)
+        if self.debug:
+            self.save_signature(rtl_input.signature, self.rtl_sig_file)
         self.debug_print('[RTLHost] Stop RTL simulation')
 
         return (SUCCESS, self.get_covsum())
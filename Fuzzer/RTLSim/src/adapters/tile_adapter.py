@@ -1,11 +1,11 @@
 import sys
-import cocotb
 
 from cocotb.decorators import coroutine
 from cocotb.triggers import RisingEdge
 
 from adapters.tilelink.adapter import tlAdapter
 from adapters.tilelink.definitions import *
+from memory.page_memory import pageMemory
 
 INT_MEIP = 0x4
 INT_SEIP = 0x8
@@ -62,8 +62,13 @@ class tileAdapter():
 
         self.monitor_pc = getattr(self.dut, pc_name)
         self.monitor_valid = getattr(self.dut, valid_name)
+        self.pc_mask = (1 << len(self.monitor_pc)) - 1
 
         self.intr = 0
+        self.ints = {}
+
+        # Checked by the tilelink adapter's scheduler every clock edge
+        self.tl_adapter.add_step(self.interrupt_step)
 
     def debug_print(self, message):
         if self.debug:
@@ -87,34 +92,33 @@ class tileAdapter():
     def pc_valid(self):
         return self.monitor_valid.value
 
-    @coroutine
-    def interrupt_handler(self, ints):
-        if not ints:
-            return
+    def interrupt_step(self):
+        if self.drive and self.ints and self.pc_valid():
+            pc = self.monitor_pc.value & self.pc_mask
+            if pc in self.ints.keys():
+                self.debug_print('[RTLHost] interrupt_handler, pc: {:016x}, INT: {:01x}'.
+                                 format(pc, self.ints[pc]))
+                self.assert_intr(self.ints[pc])
 
-        while self.drive:
-            if self.pc_valid():
-                pc = self.monitor_pc.value & ((1 << len(self.monitor_pc.value)) - 1)
-                if pc in ints.keys():
-                    self.debug_print('[RTLHost] interrupt_handler, pc: {:016x}, INT: {:01x}'.
-                                     format(pc, ints[pc]))
-                    self.assert_intr(ints[pc])
-            yield RisingEdge(self.dut.clock)
+    def watch_tohost(self, tohost_addr, period=100):
+        self.tl_adapter.watch_tohost(tohost_addr, period)
 
+    def tohost_written(self):
+        return self.tl_adapter.tohost.wait()
 
-    def probe_tohost(self, tohost_addr):
-        self.tl_adapter.probe_block(tohost_addr)
+    def tohost_done(self):
+        return self.tl_adapter.tohost.is_set()
 
     def check_assert(self):
         return self.dut.metaAssert.value
 
-    def start(self, memory, ints):
-        if memory.__class__.__name__ != 'dict':
+    def start(self, memory, ints, seed=None):
+        if not isinstance(memory, pageMemory):
             raise Exception('RocketTile Adapter must receive address map to drive DUT')
 
         self.drive = True
-        self.tl_adapter.start(memory)
-        self.intr_handler = cocotb.fork(self.interrupt_handler(ints))
+        self.ints = ints
+        self.tl_adapter.start(memory, seed)
 
     @coroutine
     def stop(self):
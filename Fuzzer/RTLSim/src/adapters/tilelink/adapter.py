@@ -4,10 +4,11 @@ import math
 import random
 import queue
 from cocotb.decorators import coroutine
-from cocotb.triggers import Timer, RisingEdge
+from cocotb.triggers import Timer, RisingEdge, Event
 
 from adapters.tilelink.definitions import *
 from adapters.tilelink.utils import *
+from memory.page_memory import pageMemory
 
 """ Tilelink adapter
 , which acts as a tilelink slave 
@@ -63,6 +64,12 @@ class tlAdapter():
         self.c_ports = Ports(dut, 'C', TL_C_FIELDS, port_names)
         self.e_ports = Ports(dut, 'E', TL_E_FIELDS, port_names)
 
+        self.sample_a = self.a_ports.sampler([ 'opcode', 'param', 'size', 'source', 'address', \
+                                               'mask', 'data' ])
+        self.sample_c = self.c_ports.sampler([ 'opcode', 'param', 'size', 'source', 'address', \
+                                               'data', 'corrupt' ])
+        self.sample_e = self.e_ports.sampler([ 'sink' ])
+
         self.a_datalen = self.a_ports.data_len // 8 # Byte width of a port data
         self.d_datalen = self.d_ports.data_len // 8 # Byte width of d port data
         self.addr_mask_a = ~((1 << int(math.log(self.a_datalen, 2))) - 1)
@@ -70,6 +77,16 @@ class tlAdapter():
 
         self.nop_data = 0
 
+        """ Per beat lookup tables, indexed by a_mask and a_size """
+        mask_len = self.a_ports.mask_len
+        self.bit_masks = [ sum([ 0xff << (8 * i) for i in range(mask_len) if (mask >> i) & 1 ]) \
+                           for mask in range(1 << mask_len) ]
+        self.mask_offsets = [ 8 * ((mask & -mask).bit_length() - 1) if mask else 0 \
+                              for mask in range(1 << mask_len) ]
+        self.mask_sizes = [ 8 * bin(mask).count('1') for mask in range(1 << mask_len) ]
+        self.burst_lens_d = [ max((1 << size) // self.d_datalen, 1) \
+                              for size in range(1 << self.a_ports.size_len) ]
+
         if self.a_datalen != self.d_datalen:
             raise Exception('{} a_data and d_data must have same width'.format(dut.name))
 
@@ -82,74 +99,86 @@ class tlAdapter():
             if self.a_datalen != self.c_datalen:
                 raise Exception('{} a_data and d_data must have same width'.format(dut.name))
 
+            self.burst_lens_c = [ max((1 << size) // self.c_datalen, 1) \
+                                  for size in range(1 << self.c_ports.size_len) ]
+
         self.d_queue = tlDQueue()
         self.b_queue = tlBQueue()
 
         """ On going TL-C transaction addresses """
         self.ongoing_tlc = {} # TODO, Need to implement
 
+        """ One scheduler samples every channel per clock edge, and is
+        forked once and re-armed per test """
+        d_sink_list = [i for i in range(0, 4)]
+        self.d_sinks = FreeList('d_sinks', d_sink_list)
+        b_src_list = [i for i in range(0, 1)] # TODO, BoomTile has 3 b_src
+        self.b_srcs = FreeList('b_srcs', b_src_list)
+
+        self.b_callback = srcToCallback('b_callback', b_src_list)
+
+        self.armed = Event('tl_armed')
+        self.driver = None
+        self.steps = [] # Per cycle handlers of the tile, run after the channels
+        self.memory = None
+        self.block_perm = None
+
         """ For probe tohost_addr """
         self.probe = 0
         self.probe_en = 1
         self.probe_addr = 0
 
+        """ Set when the test writes tohost, the tohost block is probed
+        every tohost_period cycles to write back a cached tohost """
+        self.tohost = Event('tohost')
+        self.tohost_addr = None
+        self.tohost_period = 100
+
     def set_src_msgs(self, src_msgs, src, msgs):
         assert src not in src_msgs.keys(), \
             '{} already in src_msgs'.format(src)
 
         src_msgs[src] = msgs
 
-    def get_d_messages(self, message, memory, burst_len, addr_aligned, **kwargs):
-        assert message in ['AccessAckData', 'GrantData'], \
-            'get_d_messages only returns AccessAckData/GrantAckData'
-
-        param = kwargs.get('param', 0)
-        size = kwargs['size']
-        source = kwargs['source']
-        sink = kwargs.get('sink', 0)
-
-        d_msgs = []
-        for i in range(burst_len):
-            get_addr = addr_aligned + i * self.d_datalen
-            if get_addr not in memory.keys():
-                memory[get_addr] = self.nop_data
-
-            get_data = memory[get_addr]
-            d_msgs.append(tlDMessage(message, param=param, size=size, source=source, \
-                                     sink=sink, data=get_data))
-
-        return d_msgs
+    def push_data(self, opcode, memory, burst_len, addr_aligned, callback=None, \
+                  param=0, size=0, source=0, sink=0):
+        # Unwritten words of the burst read as nop_data (0) from the page
+        self.d_queue.push_burst(opcode, callback, memory.read_words(addr_aligned, burst_len), \
+                                param=param, size=size, source=source, sink=sink)
 
     def enableProbe(self):
         self.probe_en = 1
 
+    def check_tohost(self, addr, data):
+        if addr == self.tohost_addr and data:
+            self.tohost.set()
+
 
     def updateMem(self, memory, burst_data):
-        for addr, value in burst_data:
+        for addr, value in burst_data.items():
             bit_mask = value[0]
             data = value[1]
 
-            memory[addr] = (memory.get(get_addr, 0) & (~bit_mask)) | (get_data & bit_mask)
-
-        memory.update(burst_data)
+            memory[addr] = (memory.get(addr, 0) & (~bit_mask)) | (data & bit_mask)
+            self.check_tohost(addr, memory[addr])
 
     def updatePerm(self, block_perm, block_addr, param):
         if param == toT:
             block_perm[block_addr] = TRUNK
 
-    def retrieveBlock(self, b_srcs, b_callback, callback, param, size, addr, mask, msg='ProbeBlock'):
+    def retrieveBlock(self, b_srcs, b_callback, callback, param, size, addr, mask, opcode=PROBE_BLOCK):
         if not b_srcs.empty():
-            self.retrieveBlock_cb(msg, b_srcs, b_callback, callback, param, \
+            self.retrieveBlock_cb(opcode, b_srcs, b_callback, callback, param, \
                                   size, addr, mask)
         else:
-            b_reserve = CallBack(self.retrieveBlock_cb, msg, b_srcs, b_callback, \
+            b_reserve = CallBack(self.retrieveBlock_cb, opcode, b_srcs, b_callback, \
                                  callback, param, size, addr, mask)
             b_srcs.reserve(b_reserve)
 
-    def retrieveBlock_cb(self, msg, b_srcs, b_callback, callback, param, size, addr, mask):
+    def retrieveBlock_cb(self, opcode, b_srcs, b_callback, callback, param, size, addr, mask):
         b_src = b_srcs.get()
         b_callback.set(b_src, callback)
-        self.b_queue.push(msg, param=param, size=size, \
+        self.b_queue.push(opcode, param=param, size=size, \
                           source=b_src, address=addr, mask=mask)
 
     def AccessAck_cb(self, memory, ongoings, burst_len, burst_data, size, source):
@@ -159,16 +188,17 @@ class tlAdapter():
 
         # TODO, Not the final solution (remain_clks can be longer)
         for clk in range(remain_clks):
-            self.d_queue.push('Bubble', None)
-        self.d_queue.push('AccessAck', callback_d, size=size, source=source)
+            self.d_queue.push_bubble()
+        self.d_queue.push(ACCESS_ACK, callback_d, size=size, source=source)
 
     def AccessAckData_cb(self, memory, burst_len, addr_aligned, size, source):
-        d_msgs = self.get_d_messages('AccessAckData', memory, burst_len, addr_aligned, \
-                                size=size, source=source)
+        self.push_data(ACCESS_ACK_DATA, memory, burst_len, addr_aligned, \
+                       size=size, source=source)
 
-        self.d_queue.push_msgs(d_msgs)
+    def ArithmeticAck_cb(self, operand1, memory, burst_len, addr_aligned, param, mask, size, source):
+        bit_mask = self.bit_masks[mask]
+        offset = self.mask_offsets[mask]
 
-    def ArithmeticAck_cb(self, operand1, memory, burst_len, addr_aligned, bit_mask, offset, size, source):
         operand2 = (memory[addr_aligned] & bit_mask) >> offset
         result = (self._arithmetic_op(param, operand1, operand2, mask) << offset) & \
             self.a_ports.data_mask
@@ -176,44 +206,41 @@ class tlAdapter():
         assert burst_len == 1, 'ArithmeticAck_cb, burst_len should be 1'
 
         memory[addr_aligned] = (memory.get(addr_aligned, 0) & (~bit_mask)) | (result & bit_mask)
+        self.check_tohost(addr_aligned, memory[addr_aligned])
         self.AccessAckData_cb(memory, burst_len, addr_aligned, size, source)
 
-    def LogicalAck_cb(self, operand1, memory, burst_len, addr_aligned, bit_mask, offset, size, source):
+    def LogicalAck_cb(self, operand1, memory, burst_len, addr_aligned, param, mask, size, source):
+        bit_mask = self.bit_masks[mask]
+        offset = self.mask_offsets[mask]
+
         operand2 = (memory[addr_aligned] & bit_mask) >> offset
-        result = (self._logical_op(param, operand1, operand2, mask) << offset) & \
+        result = (self._logical_op(param, operand1, operand2) << offset) & \
             self.a_ports.data_mask
 
         assert burst_len == 1, 'LogicalAck_cb, burst_len should be 1'
 
         memory[addr_aligned] = (memory.get(addr_aligned, 0) & (~bit_mask)) | (result & bit_mask)
+        self.check_tohost(addr_aligned, memory[addr_aligned])
         self.AccessAckData_cb(memory, burst_len, addr_aligned, size, source)
 
     def Grant_cb(self, param, sink, size, source, block_perm, block_addr):
         callback_d = CallBack(self.updatePerm, block_perm, block_addr, param)
 
         self.ongoing_tlc[sink] = block_addr
-        self.d_queue.push('Grant', callback_d, param=param, size=size, source=source)
+        self.d_queue.push(GRANT, callback_d, param=param, size=size, source=source, sink=sink)
 
     def GrantData_cb(self, memory, burst_len, addr_aligned, param, sink, size, source, \
                      block_perm, block_addr):
         callback_d = CallBack(self.updatePerm, block_perm, block_addr, param)
-        d_msgs = self.get_d_messages('GrantData', memory, burst_len, addr_aligned, \
-                                param=param, sink=sink, size=size, source=source)
-        cbs = [ callback_d ] + [None for i in range(len(d_msgs) - 1)]
 
         self.ongoing_tlc[sink] = block_addr
-        self.d_queue.push_msg_cbs(d_msgs, cbs)
+        self.push_data(GRANT_DATA, memory, burst_len, addr_aligned, callback_d, \
+                       param=param, sink=sink, size=size, source=source)
 
 
     def _arithmetic_op(self, param, operand1, operand2, mask):
-        # Count the number of nonzero bits in mask
-        size_op = 0
-        while mask >= 1:
-            if mask % 2 == 0:
-                mask = mask // 2
-            else:
-                size_op = size_op + 8
-                mask = mask // 2
+        # Operand bits, 8 per nonzero bit in mask
+        size_op = self.mask_sizes[mask]
         op_mask = (1 << size_op) - 1
         signed_op1 = operand1
         signed_op2 = operand2
@@ -265,489 +292,492 @@ class tlAdapter():
                                addr, mask)
 
         else:
-            self.drive = False
+            self.disarm()
 
+    def disarm(self):
+        self.drive = False
+        self.armed.clear()
+
+    def add_step(self, step):
+        self.steps.append(step)
+
+    def arm_channels(self):
+        self.a_ongoings = {} # On going TL-A transactions (src - count)
+        self.a_burst_data = {}
+        self.c_ongoings = {} # On going TL-C transactions (src - count)
+        self.d_busy = False
+        self.b_busy = False
+        self.retrieving = False
+        self.cycle = 0
+
+        self.a_ports.ready <= 1
+        self.c_ports.ready <= 1
+        self.e_ports.ready <= 1
+        self.d_ports.clear()
+        self.b_ports.clear()
+
+    def disarm_channels(self):
+        self.a_ports.ready <= 0
+        self.c_ports.ready <= 0
+        self.e_ports.ready <= 0
+        self.d_ports.clear()
+        self.d_ports.valid <= 0
+        self.b_ports.clear()
+        self.b_ports.valid <= 0
 
-    def drive_input(self, memory):
-        assert memory.__class__.__name__ == 'dict', \
-            'tlAdapter.drive_input need dict'
+    @coroutine
+    def scheduler(self):
+        clkedge = RisingEdge(self.dut.clock)
+
+        while True:
+            yield self.armed.wait()
+
+            self.arm_channels()
+            steps = [ self.a_step, self.c_step, self.e_step, self.d_step, self.b_step,
+                      self.retrieve_step, self.host_step ] + self.steps
+            while self.drive:
+                for step in steps:
+                    step()
+                yield clkedge
+
+            self.disarm_channels()
+
+    def drive_input(self, memory, seed=None):
+        assert isinstance(memory, pageMemory), \
+            'tlAdapter.drive_input need pageMemory'
+        assert self.d_datalen == 8, \
+            'pageMemory holds 64-bit words, d_data is {} bytes'.format(self.d_datalen)
 
         block_perm = {}
         # TODO, check the resolution of block permissions
-        for addr in set([i & self.block_mask for i in memory.keys()]):
+        for addr in memory.blocks(self.block_size):
             block_perm[addr] = TIP
 
         self.b_queue.clear()
         self.d_queue.clear()
 
-        d_sink_list = [i for i in range(0, 4)]
-        d_sinks = FreeList('d_sinks', d_sink_list)
-        b_src_list = [i for i in range(0, 1)] # TODO, BoomTile has 3 b_src
-        b_srcs = FreeList('b_srcs', b_src_list)
-
-        b_callback = srcToCallback('b_callback', b_src_list)
+        self.d_sinks.reset(seed)
+        self.b_srcs.reset(seed)
+        self.b_callback.reset()
 
-        self.a_monitor = cocotb.fork(self.a_port_monitor(memory, block_perm, d_sinks, \
-                                                         b_srcs, b_callback))
-        self.c_monitor = cocotb.fork(self.c_port_monitor(memory, block_perm, b_srcs, \
-                                                         b_callback))
-        self.e_monitor = cocotb.fork(self.e_port_monitor(memory, d_sinks))
+        self.memory = memory
+        self.block_perm = block_perm
 
-        self.d_driver = cocotb.fork(self.d_port_driver())
-        self.b_driver = cocotb.fork(self.b_port_driver())
+        self.probe = 0
+        self.probe_en = 1
+        self.probe_addr = 0
 
-        self.retriever = cocotb.fork(self.data_retriever(block_perm, b_srcs, b_callback))
-        self.host_if = cocotb.fork(self.host_interface(block_perm, b_srcs, b_callback))
+        if not self.driver:
+            self.driver = cocotb.fork(self.scheduler())
 
-    @coroutine
-    def a_port_monitor(self, memory, block_perm, d_sinks, b_srcs, b_callback):
+        self.armed.set()
 
-        clkedge = RisingEdge(self.dut.clock)
+    def a_step(self):
         a_ports = self.a_ports
+        if not a_ports.fire():
+            return
 
-        ongoings = {} # On going TL-A transactions (src - count)
-
-        a_ports.ready <= 1
-        while self.drive:
-            if a_ports.fire():
-                opcode = a_ports.get('opcode')
-                param = a_ports.get('param')
-                size = a_ports.get('size')
-                source = a_ports.get('source')
-                addr = a_ports.get('address')
-                mask = a_ports.get('mask')
-                data = a_ports.get('data')
-
-                A_assertions(opcode, param, size, addr, mask, self.debug)
-
-                assert not ongoings or source in ongoings.keys(), \
-                    'Messages in A channel can not be interleaved'
-
-                addr_aligned = addr & self.addr_mask_d
-                block_addr = addr & self.block_mask
-                burst_len = int(max(pow(2, size) / self.d_datalen, 1))
-                bit_mask = int(''.join([ '{:02x}'.format(0xff * int(i)) \
-                                        for i in ('{:0b}'.format(mask))]), 16)
-
-                block_perm[block_addr] = block_perm.get(block_addr, TIP)
-
-                " TL-UL "
-                if opcode == GET:
-                    " Check block permission "
-                    if block_perm[block_addr] != TIP:
-                        callback = CallBack(self.AccessAckData_cb, memory, burst_len, \
-                                                 addr_aligned, size, source)
-                        self.retrieveBlock(b_srcs, b_callback, callback, toT, size, \
-                                           addr, mask)
-
-                    else:
-                        d_msgs = self.get_d_messages('AccessAckData', memory, burst_len, addr_aligned, \
-                                                     size=size, source=source)
-                        self.d_queue.push_msgs(d_msgs)
-
-                if opcode == PUT_FULL_DATA:
-                    count = ongoings.get(source, 0)
-                    get_addr = addr_aligned + count * self.a_datalen
-
-                    # TODO, Block_perm should not change during burst
-                    if block_perm[block_addr] != TIP:
-                        if count == 0:
-                            burst_data = {}
-                            callback = CallBack(self.AccessAck_cb, memory, ongoings, \
-                                                burst_len, burst_data, size, source)
-                            self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
-                                               addr, mask)
-
-                        burst_data[get_addr] = (bit_mask, data)
-                    else:
-                        masked_data = memory.get(get_addr, 0) & (~bit_mask)
-                        get_data = masked_data | (data & bit_mask)
-
-                        memory[get_addr] = get_data
-
-                        if count + 1 == burst_len:
-                            self.d_queue.push('AccessAck', None, size=size, source=source)
-                            if count: ongoings.pop(source)
-                        else:
-                            ongoings[source] = count + 1
-
-                if opcode == PUT_PARTIAL_DATA:
-                    count = ongoings.get(source, 0)
-                    get_addr = addr_aligned + count * self.a_datalen
-
-                    # TODO, Block_perm should not change during burst
-                    if block_perm[block_addr] != TIP:
-                        if count == 0:
-                            burst_data = {}
-                            callback = CallBack(self.AccessAck_cb, memory, ongoings, \
-                                                burst_len, burst_data, size, source)
-                            self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
-                                               addr, mask)
-
-                        burst_data[get_addr] = (bit_mask, data)
-                    else:
-                        masked_data = memory.get(get_addr, 0) & (~bit_mask)
-                        get_data = masked_data | (data & bit_mask)
-
-                        memory[get_addr] = get_data
-
-                        if count + 1 == burst_len:
-                            self.d_queue.push('AccessAck', None, size=size, source=source)
-                            if count: ongoings.pop(source)
-                        else:
-                            ongoings[source] = count + 1
-
-                " TL-UH "
-                if opcode == ARITHMETIC_DATA and \
-                   self.protocol >= TL_UH:
-
-                    count = ongoings.get(source, 0)
-
-                    # TODO, extend to multiple block
-                    assert burst_len == 1, \
-                        'ARITHMETIC_DATA can not span over multiple block'
-
-                    total_mask = 0
-                    offset = int(math.log((mask & -mask), 2) * 8)
-
-                    get_addr = addr_aligned + count * self.a_datalen
-                    get_data = data & bit_mask
-
-                    operand1 = get_data >> offset
-
-                    # TODO, Block_perm should not change during burst
-                    if block_perm[block_addr] != TIP:
-                        callback = CallBack(self.ArithmeticAck_cb, operand1, memory, burst_len, \
-                                            addr_aligned, bit_mask, offset, size, source)
-                        self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
-                                           addr, mask)
-
-                    else:
-                        if get_addr not in memory.keys():
-                            memory[get_addr] = self.nop_data
-                        # TODO, operand2 offset?
-                        operand2 = (memory[get_addr] & bit_mask) >> offset
-                        result = (self._arithmetic_op(param, operand1, operand2, mask) << offset) & \
-                            self.a_ports.data_mask # TODO, check _arithmetic_op
-
-                        memory[get_addr] = (memory[get_addr] & (~bit_mask)) | (result & bit_mask)
-                        self.d_queue.push('AccessAckData', None, size=size, source=source, data=operand2)
-
-                if opcode == LOGICAL_DATA and \
-                   self.protocol >= TL_UH:
+        memory = self.memory
+        block_perm = self.block_perm
+        (d_sinks, b_srcs, b_callback) = (self.d_sinks, self.b_srcs, self.b_callback)
+        ongoings = self.a_ongoings
+        burst_data = self.a_burst_data
 
-                    count = ongoings.get(source, 0)
+        (opcode, param, size, source, addr, mask, data) = self.sample_a()
 
-                    # TODO, extend to multiple block
-                    assert burst_len == 1, \
-                        'LOGICAL_DATA can not span over multiple block'
+        A_assertions(opcode, param, size, addr, mask, self.debug)
 
-                    total_mask = 0
-                    offset = int(math.log((mask & -mask), 2) * 8)
+        assert not ongoings or source in ongoings.keys(), \
+            'Messages in A channel can not be interleaved'
 
-                    get_addr = addr_aligned + count * self.a_datalen
-                    get_data = data & bit_mask
+        addr_aligned = addr & self.addr_mask_d
+        block_addr = addr & self.block_mask
+        burst_len = self.burst_lens_d[size]
+        bit_mask = self.bit_masks[mask]
 
-                    operand1 = get_data >> offset
+        block_perm[block_addr] = block_perm.get(block_addr, TIP)
 
-                    # TODO, Block_perm should not change during burst
-                    if block_perm[block_addr] != TIP:
+        " TL-UL "
+        if opcode == GET:
+            " Check block permission "
+            if block_perm[block_addr] != TIP:
+                callback = CallBack(self.AccessAckData_cb, memory, burst_len, \
+                                         addr_aligned, size, source)
+                self.retrieveBlock(b_srcs, b_callback, callback, toT, size, \
+                                   addr, mask)
 
-                        callback = CallBack(self.LogicalAck_cb, operand1, memory, burst_len, \
-                                            addr_aligned, bit_mask, offset, size, source)
-                        self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
-                                           addr, mask)
-
-                    else:
-                        if get_addr not in memory.keys():
-                            memory[get_addr] = self.nop_data
-                        operand2 = (memory[get_addr] & bit_mask) >> offset
-                        result = (self._logical_op(param, operand1, operand2) << offset) & \
-                            self.a_ports.data_mask # TODO, check _logical_op
-
-                        memory[get_addr] = (memory[get_addr] & (~bit_mask)) | (result & bit_mask)
-                        self.d_queue.push('AccessAckData', None, size=size, source=source, data=operand2)
-
-                if opcode == INTENT and \
-                   self.protocol >= TL_UH:
+            else:
+                self.push_data(ACCESS_ACK_DATA, memory, burst_len, addr_aligned, \
+                               size=size, source=source)
+
+        if opcode == PUT_FULL_DATA:
+            count = ongoings.get(source, 0)
+            get_addr = addr_aligned + count * self.a_datalen
+
+            # TODO, Block_perm should not change during burst
+            if block_perm[block_addr] != TIP:
+                if count == 0:
+                    burst_data = {}
+                    self.a_burst_data = burst_data
+                    callback = CallBack(self.AccessAck_cb, memory, ongoings, \
+                                        burst_len, burst_data, size, source)
+                    self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
+                                       addr, mask)
 
-                    self.d_queue.push('HintAck', None, size=size, source=source)
+                burst_data[get_addr] = (bit_mask, data)
+            else:
+                masked_data = memory.get(get_addr, 0) & (~bit_mask)
+                get_data = masked_data | (data & bit_mask)
 
-                " TL-C "
-                if opcode == ACQUIRE_BLOCK and \
-                   self.protocol == TL_C:
+                memory[get_addr] = get_data
+                self.check_tohost(get_addr, memory[get_addr])
 
-                    d_sink = d_sinks.get()
+                if count + 1 == burst_len:
+                    self.d_queue.push(ACCESS_ACK, None, size=size, source=source)
+                    if count: ongoings.pop(source)
+                else:
+                    ongoings[source] = count + 1
+
+        if opcode == PUT_PARTIAL_DATA:
+            count = ongoings.get(source, 0)
+            get_addr = addr_aligned + count * self.a_datalen
+
+            # TODO, Block_perm should not change during burst
+            if block_perm[block_addr] != TIP:
+                if count == 0:
+                    burst_data = {}
+                    self.a_burst_data = burst_data
+                    callback = CallBack(self.AccessAck_cb, memory, ongoings, \
+                                        burst_len, burst_data, size, source)
+                    self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
+                                       addr, mask)
 
-                    if param == NtoB: d_param = toB
-                    else: d_param = toT
+                burst_data[get_addr] = (bit_mask, data)
+            else:
+                masked_data = memory.get(get_addr, 0) & (~bit_mask)
+                get_data = masked_data | (data & bit_mask)
 
-                    if block_perm[block_addr] != TIP:
-                        if param == NtoB: b_param = toB
-                        else: b_param = toN
+                memory[get_addr] = get_data
+                self.check_tohost(get_addr, memory[get_addr])
 
-                        callback = CallBack(self.GrantData_cb, memory, burst_len, addr_aligned, \
-                                                 d_param, d_sink, size, source, block_perm, block_addr)
-                        self.retrieveBlock(b_srcs, b_callback, callback, b_param, size, \
-                                           addr, mask)
+                if count + 1 == burst_len:
+                    self.d_queue.push(ACCESS_ACK, None, size=size, source=source)
+                    if count: ongoings.pop(source)
+                else:
+                    ongoings[source] = count + 1
 
-                    else:
-                        callback_d = CallBack(self.updatePerm, block_perm, block_addr, d_param)
-                        d_msgs = self.get_d_messages('GrantData', memory, burst_len, addr_aligned, \
-                                                param=d_param, size=size, source=source, sink=d_sink)
-                        cbs = [ callback_d ] + [ None for i in range(len(d_msgs) - 1) ]
+        " TL-UH "
+        if opcode == ARITHMETIC_DATA and \
+           self.protocol >= TL_UH:
 
-                        self.ongoing_tlc[d_sink] = block_addr
-                        self.d_queue.push_msg_cbs(d_msgs, cbs)
+            count = ongoings.get(source, 0)
 
-                if opcode == ACQUIRE_PERM and \
-                   self.protocol == TL_C:
+            # TODO, extend to multiple block
+            assert burst_len == 1, \
+                'ARITHMETIC_DATA can not span over multiple block'
 
-                    d_sink = d_sinks.get()
+            total_mask = 0
+            offset = self.mask_offsets[mask]
 
-                    if param == NtoB: d_param = toB
-                    else: d_param = toT
+            get_addr = addr_aligned + count * self.a_datalen
+            get_data = data & bit_mask
 
-                    if block_perm[block_addr] != TIP:
-                        if param == NtoB: b_param = toB
-                        else: b_param = toN
+            operand1 = get_data >> offset
 
-                        callback = CallBack(self.Grant_cb, d_param, d_sink, size, source, \
-                                                 block_perm, block_addr)
-                        self.retrievePerm(b_srcs, b_callback, callback, b_param, size, \
-                                           addr, mask, 'ProbePerm')
+            # TODO, Block_perm should not change during burst
+            if block_perm[block_addr] != TIP:
+                callback = CallBack(self.ArithmeticAck_cb, operand1, memory, burst_len, \
+                                    addr_aligned, param, mask, size, source)
+                self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
+                                   addr, mask)
 
-                    else:
-                        callback_d = CallBack(self.updatePerm, block_perm, block_addr, d_param)
+            else:
+                if get_addr not in memory:
+                    memory[get_addr] = self.nop_data
+                # TODO, operand2 offset?
+                operand2 = (memory[get_addr] & bit_mask) >> offset
+                result = (self._arithmetic_op(param, operand1, operand2, mask) << offset) & \
+                    self.a_ports.data_mask # TODO, check _arithmetic_op
 
-                        self.ongoing_tlc[d_sink] = block_addr
-                        self.d_queue.push('Grant', callback_d, param=d_param, size=size, \
-                                          source=source, sink=d_sink)
+                memory[get_addr] = (memory[get_addr] & (~bit_mask)) | (result & bit_mask)
+                self.check_tohost(get_addr, memory[get_addr])
+                self.d_queue.push(ACCESS_ACK_DATA, None, size=size, source=source, data=operand2)
 
-            yield clkedge
+        if opcode == LOGICAL_DATA and \
+           self.protocol >= TL_UH:
 
-        a_ports.ready <= 0
+            count = ongoings.get(source, 0)
 
-    @coroutine
-    def c_port_monitor(self, memory, block_perm, b_srcs, b_callback):
+            # TODO, extend to multiple block
+            assert burst_len == 1, \
+                'LOGICAL_DATA can not span over multiple block'
 
-        clkedge = RisingEdge(self.dut.clock)
-        c_ports = self.c_ports
+            total_mask = 0
+            offset = self.mask_offsets[mask]
 
-        ongoings = {} # On going transactions (src - count)
+            get_addr = addr_aligned + count * self.a_datalen
+            get_data = data & bit_mask
 
-        c_ports.ready <= 1
-        while self.drive:
-            if c_ports.fire():
-                opcode = c_ports.get('opcode')
-                param = c_ports.get('param')
-                size = c_ports.get('size')
-                source = c_ports.get('source')
-                addr = c_ports.get('address')
-                data = c_ports.get('data')
-                corrupt = c_ports.get('corrupt')
+            operand1 = get_data >> offset
 
-                C_assertions(opcode, param, size, addr, corrupt, self.debug)
+            # TODO, Block_perm should not change during burst
+            if block_perm[block_addr] != TIP:
 
-                assert not ongoings or source in ongoings.keys(), \
-                    'Messages in C channel can not be interleaved'
+                callback = CallBack(self.LogicalAck_cb, operand1, memory, burst_len, \
+                                    addr_aligned, param, mask, size, source)
+                self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
+                                   addr, mask)
 
-                addr_aligned = addr & self.addr_mask_c
-                block_addr = addr & self.block_mask
-                burst_len = int(max(pow(2, size) / self.c_datalen, 1))
+            else:
+                if get_addr not in memory:
+                    memory[get_addr] = self.nop_data
+                operand2 = (memory[get_addr] & bit_mask) >> offset
+                result = (self._logical_op(param, operand1, operand2) << offset) & \
+                    self.a_ports.data_mask # TODO, check _logical_op
 
-                if opcode == ACCESS_ACK:
-                    raise NotImplementedError()
+                memory[get_addr] = (memory[get_addr] & (~bit_mask)) | (result & bit_mask)
+                self.check_tohost(get_addr, memory[get_addr])
+                self.d_queue.push(ACCESS_ACK_DATA, None, size=size, source=source, data=operand2)
 
-                if opcode == ACCESS_ACK_DATA:
-                    raise NotImplementedError()
+        if opcode == INTENT and \
+           self.protocol >= TL_UH:
 
-                if opcode == HINT_ACK:
-                    raise NotImplementedError()
+            self.d_queue.push(HINT_ACK, None, size=size, source=source)
 
-                if opcode == PROBE_ACK:
-                    if param in [ TtoB, TtoN ]:
-                        block_perm[block_addr] = TIP
+        " TL-C "
+        if opcode == ACQUIRE_BLOCK and \
+           self.protocol == TL_C:
 
-                    b_callback.call(source)
-                    b_srcs.release(source)
+            d_sink = d_sinks.get()
 
-                if opcode == PROBE_ACK_DATA:
-                    count = ongoings.get(source, 0)
-                    get_addr = addr_aligned + count * self.c_datalen
+            if param == NtoB: d_param = toB
+            else: d_param = toT
 
-                    memory[get_addr] = data
+            if block_perm[block_addr] != TIP:
+                if param == NtoB: b_param = toB
+                else: b_param = toN
 
-                    if count + 1 == burst_len:
-                        if param in [ TtoB, TtoN ]:
-                            block_perm[block_addr] = TIP
+                callback = CallBack(self.GrantData_cb, memory, burst_len, addr_aligned, \
+                                         d_param, d_sink, size, source, block_perm, block_addr)
+                self.retrieveBlock(b_srcs, b_callback, callback, b_param, size, \
+                                   addr, mask)
 
-                        b_callback.call(source)
-                        b_srcs.release(source)
+            else:
+                callback_d = CallBack(self.updatePerm, block_perm, block_addr, d_param)
 
-                        if count: ongoings.pop(source)
-                    else:
-                        ongoings[source] = count + 1
+                self.ongoing_tlc[d_sink] = block_addr
+                self.push_data(GRANT_DATA, memory, burst_len, addr_aligned, callback_d, \
+                               param=d_param, size=size, source=source, sink=d_sink)
 
-                if opcode == RELEASE:
-                    if param in [ TtoB, TtoN ]:
-                        block_perm[block_addr] = TIP
+        if opcode == ACQUIRE_PERM and \
+           self.protocol == TL_C:
 
-                    self.d_queue.push('ReleaseAck', None, size=size, source=source)
+            d_sink = d_sinks.get()
 
-                if opcode == RELEASE_DATA:
-                    count = ongoings.get(source, 0)
-                    get_addr = addr_aligned + count * self.c_datalen
+            if param == NtoB: d_param = toB
+            else: d_param = toT
 
-                    memory[get_addr] = data
+            if block_perm[block_addr] != TIP:
+                if param == NtoB: b_param = toB
+                else: b_param = toN
 
-                    if count + 1 == burst_len:
-                        if param in [ TtoB, TtoN ]:
-                            block_perm[block_addr] = TIP
+                callback = CallBack(self.Grant_cb, d_param, d_sink, size, source, \
+                                         block_perm, block_addr)
+                self.retrieveBlock(b_srcs, b_callback, callback, b_param, size, \
+                                   addr, mask, PROBE_PERM)
 
-                        self.d_queue.push('ReleaseAck', None, size=size, source=source)
+            else:
+                callback_d = CallBack(self.updatePerm, block_perm, block_addr, d_param)
 
-                        if count: ongoings.pop(source)
-                    else:
-                        ongoings[source] = count + 1
+                self.ongoing_tlc[d_sink] = block_addr
+                self.d_queue.push(GRANT, callback_d, param=d_param, size=size, \
+                                  source=source, sink=d_sink)
 
-            yield clkedge
+    def c_step(self):
+        c_ports = self.c_ports
+        if not c_ports.fire():
+            return
 
-        c_ports.ready <= 0
+        memory = self.memory
+        block_perm = self.block_perm
+        (b_srcs, b_callback) = (self.b_srcs, self.b_callback)
+        ongoings = self.c_ongoings
 
-    @coroutine
-    def e_port_monitor(self, memory, d_sinks):
+        (opcode, param, size, source, addr, data, corrupt) = self.sample_c()
 
-        clkedge = RisingEdge(self.dut.clock)
-        e_ports = self.e_ports
+        C_assertions(opcode, param, size, addr, corrupt, self.debug)
 
-        e_ports.ready <= 1
-        while self.drive:
-            if e_ports.fire():
-                sink = e_ports.get('sink')
-                d_sinks.release(sink)
-                self.ongoing_tlc.pop(sink)
+        assert not ongoings or source in ongoings.keys(), \
+            'Messages in C channel can not be interleaved'
 
-            yield clkedge
+        addr_aligned = addr & self.addr_mask_c
+        block_addr = addr & self.block_mask
+        burst_len = self.burst_lens_c[size]
 
-        e_ports.ready <= 0
+        if opcode == ACCESS_ACK:
+            raise NotImplementedError()
 
-    @coroutine
-    def d_port_driver(self):
+        if opcode == ACCESS_ACK_DATA:
+            raise NotImplementedError()
 
-        clkedge = RisingEdge(self.dut.clock)
-        d_ports = self.d_ports
+        if opcode == HINT_ACK:
+            raise NotImplementedError()
 
-        d_ports.clear()
-        while self.drive:
-            if not self.d_queue.empty():
-                msg_callback = self.d_queue.pop()
-                msg = msg_callback[0]
-                if msg:
-                    callback = msg_callback[1]
-                    if callback:
-                        callback.call()
-
-                    d_ports.opcode <= msg.opcode
-                    d_ports.param <= msg.param
-                    d_ports.size <= msg.size
-                    d_ports.source <= msg.source
-                    d_ports.sink <= msg.sink
-                    d_ports.data <= msg.data
-                    d_ports.corrupt <= msg.corrupt
-                    d_ports.denied <= msg.denied
-
-                    d_ports.valid <= 1
-                    yield clkedge
-                    while not d_ports.fire():
-                        yield clkedge
-
-                    d_ports.clear()
-                    d_ports.valid <= 0
+        if opcode == PROBE_ACK:
+            if param in [ TtoB, TtoN ]:
+                block_perm[block_addr] = TIP
 
-                else:
-                    yield clkedge
-            else:
-                yield clkedge
+            b_callback.call(source)
+            b_srcs.release(source)
 
-        d_ports.clear()
+        if opcode == PROBE_ACK_DATA:
+            count = ongoings.get(source, 0)
+            get_addr = addr_aligned + count * self.c_datalen
 
-    @coroutine
-    def b_port_driver(self):
+            memory[get_addr] = data
+            self.check_tohost(get_addr, memory[get_addr])
 
-        clkedge = RisingEdge(self.dut.clock)
-        b_ports = self.b_ports
+            if count + 1 == burst_len:
+                if param in [ TtoB, TtoN ]:
+                    block_perm[block_addr] = TIP
 
-        b_ports.clear()
-        while self.drive:
-            if not self.b_queue.empty():
-                msg = self.b_queue.pop()
-                if msg:
-                    b_ports.opcode <= msg.opcode
-                    b_ports.param <= msg.param
-                    b_ports.size <= msg.size
-                    b_ports.source <= msg.source
-                    b_ports.address <= msg.address
-                    b_ports.mask <= msg.mask
-                    b_ports.data <= msg.data
-
-                    b_ports.valid <= 1
-                    yield clkedge
-                    while not b_ports.fire():
-                        yield clkedge
-
-                    b_ports.clear()
-                    b_ports.valid <= 0
+                b_callback.call(source)
+                b_srcs.release(source)
 
-                else:
-                    yield clkedge
+                if count: ongoings.pop(source)
             else:
-                yield clkedge
+                ongoings[source] = count + 1
 
-        b_ports.clear()
+        if opcode == RELEASE:
+            if param in [ TtoB, TtoN ]:
+                block_perm[block_addr] = TIP
 
-    @coroutine
-    def data_retriever(self, block_perm, b_srcs, b_callback):
-        clkedge = RisingEdge(self.dut.clock)
+            self.d_queue.push(RELEASE_ACK, None, size=size, source=source)
 
-        while not self.retrieve:
-            yield clkedge
+        if opcode == RELEASE_DATA:
+            count = ongoings.get(source, 0)
+            get_addr = addr_aligned + count * self.c_datalen
 
-        self.probe_blocks(block_perm, b_srcs, b_callback)
+            memory[get_addr] = data
+            self.check_tohost(get_addr, memory[get_addr])
 
-    @coroutine
-    def host_interface(self, block_perm, b_srcs, b_callback):
-        clkedge = RisingEdge(self.dut.clock)
-
-        while self.drive:
-            if (self.probe & self.probe_en) and self.probe_addr not in self.ongoing_tlc.values():
-                block_addr = self.probe_addr & self.block_mask
-                mask = (1 << self.b_datalen) - 1
-                size = int(math.log(self.block_size, 2))
+            if count + 1 == burst_len:
+                if param in [ TtoB, TtoN ]:
+                    block_perm[block_addr] = TIP
 
-                assert block_addr in block_perm.keys(), \
-                    '{:016x} not in block_perm.keys()'.format(block_addr)
+                self.d_queue.push(RELEASE_ACK, None, size=size, source=source)
 
-                if block_perm[block_addr] != TIP:
-                    callback = CallBack(self.enableProbe)
-                    self.retrieveBlock(b_srcs, b_callback, callback, toN, size, \
-                                       self.probe_addr, mask)
+                if count: ongoings.pop(source)
+            else:
+                ongoings[source] = count + 1
 
-                    self.probe = 0
-                    self.probe_en = 0
-                    self.probe_addr = 0
+    def e_step(self):
+        e_ports = self.e_ports
+        if e_ports.fire():
+            sink = self.sample_e()[0]
+            self.d_sinks.release(sink)
+            self.ongoing_tlc.pop(sink)
 
-            yield clkedge
+    def d_step(self):
+        d_ports = self.d_ports
+        if self.d_busy:
+            if not d_ports.fire():
+                return
+
+            d_ports.clear()
+            d_ports.valid <= 0
+            self.d_busy = False
+
+        if not self.d_queue.empty():
+            msg_callback = self.d_queue.pop()
+            msg = msg_callback[0]
+            if msg:
+                callback = msg_callback[1]
+                if callback:
+                    callback.call()
+
+                d_ports.opcode <= msg.opcode
+                d_ports.param <= msg.param
+                d_ports.size <= msg.size
+                d_ports.source <= msg.source
+                d_ports.sink <= msg.sink
+                d_ports.data <= msg.data
+                d_ports.corrupt <= msg.corrupt
+                d_ports.denied <= msg.denied
+                self.d_queue.free(msg)
+
+                d_ports.valid <= 1
+                self.d_busy = True
+
+    def b_step(self):
+        b_ports = self.b_ports
+        if self.b_busy:
+            if not b_ports.fire():
+                return
+
+            b_ports.clear()
+            b_ports.valid <= 0
+            self.b_busy = False
+
+        if not self.b_queue.empty():
+            msg = self.b_queue.pop()[0]
+            if msg:
+                b_ports.opcode <= msg.opcode
+                b_ports.param <= msg.param
+                b_ports.size <= msg.size
+                b_ports.source <= msg.source
+                b_ports.address <= msg.address
+                b_ports.mask <= msg.mask
+                b_ports.data <= msg.data
+                self.b_queue.free(msg)
+
+                b_ports.valid <= 1
+                self.b_busy = True
+
+    def retrieve_step(self):
+        if self.retrieve and not self.retrieving:
+            self.retrieving = True
+            self.probe_blocks(self.block_perm, self.b_srcs, self.b_callback)
+
+    def host_step(self):
+        block_perm = self.block_perm
+
+        self.cycle += 1
+        if self.tohost_addr is not None and self.cycle % self.tohost_period == 0 and \
+           not self.tohost.is_set():
+            self.probe_block(self.tohost_addr)
+
+        if (self.probe & self.probe_en) and self.probe_addr not in self.ongoing_tlc.values():
+            block_addr = self.probe_addr & self.block_mask
+            mask = (1 << self.b_datalen) - 1
+            size = int(math.log(self.block_size, 2))
+
+            assert block_addr in block_perm.keys(), \
+                '{:016x} not in block_perm.keys()'.format(block_addr)
+
+            if block_perm[block_addr] != TIP:
+                callback = CallBack(self.enableProbe)
+                self.retrieveBlock(self.b_srcs, self.b_callback, callback, toN, size, \
+                                   self.probe_addr, mask)
+
+                self.probe = 0
+                self.probe_en = 0
+                self.probe_addr = 0
 
     def probe_block(self, probe_addr):
         self.probe = 1
         self.probe_addr = probe_addr
 
-    def start(self, memory):
+    def watch_tohost(self, tohost_addr, period=100):
+        self.tohost.clear()
+        self.tohost_addr = tohost_addr
+        self.tohost_period = period
+
+    def start(self, memory, seed=None):
         self.drive = True
         self.retrieve = False
 
-        self.drive_input(memory)
+        self.drive_input(memory, seed)
 
     def stop(self):
         self.retrieve = True
@@ -1,5 +1,5 @@
 import random
-import queue
+from collections import deque
 
 from adapters.tilelink.definitions import *
 
@@ -43,6 +43,15 @@ class Ports:
     def get(self, attr):
         return getattr(self, attr).value & getattr(self, attr + '_mask')
 
+    # Returns a function reading the given fields at once as a tuple
+    def sampler(self, fields):
+        ports = tuple([ (getattr(self, attr), getattr(self, attr + '_mask')) for attr in fields ])
+
+        def sample():
+            return tuple([ port.value & mask for (port, mask) in ports ])
+
+        return sample
+
     def fire(self):
         return self.ready.value & self.valid.value
 
@@ -66,198 +75,161 @@ class CallBack():
 """ Tilelinke D_ports/B_ports Queue
 Merge responses from TL_A_port and TL_C_port into queue.
 Used for serializing the responses into the responses in ports
+
+Messages are pushed with their opcode, as (record, callback) pairs in a
+deque. The port driver hands a record back with free() once it has been
+driven, and pushes reuse the freed records.
 """
 class tlDMessage():
     __slots__ = ('opcode', 'param', 'size', 'source', 'sink', 'data', 'corrupt', 'denied')
-    messages = ('AccessAckData', 'AccessAck', 'HintAck', 'Grant', 'GrantData', \
-                'ReleaseAck')
-
-    def __init__(self, message, **kwargs):
-        assert message in self.messages, \
-            '{} is not in tlDMessages'.format(message)
 
+    def __init__(self):
         for attr in self.__slots__:
             setattr(self, attr, 0)
 
-        if message == 'AccessAckData':
-            self.opcode = ACCESS_ACK_DATA
-            self.param = 0
-            self.data = kwargs['data']
-
-        elif message == 'AccessAck':
-            self.opcode = ACCESS_ACK
-            self.param = 0
-
-        elif message == 'HintAck':
-            self.opcode = HINT_ACK
-            self.param = 0
-
-        elif message == 'Grant':
-            self.opcode = GRANT
-            self.param = kwargs['param']
-            self.sink = kwargs['sink']
-
-        elif message == 'GrantData':
-            self.opcode = GRANT_DATA
-            self.param = kwargs['param']
-            self.sink = kwargs['sink']
-            self.data = kwargs['data']
-
-        else: # ReleaseAck
-            self.opcode = RELEASE_ACK
-            self.param = 0
-
-        self.size = kwargs['size']
-        self.source = kwargs['source']
-
 
 class tlBMessage():
     __slots__ = ('opcode', 'param', 'size', 'source', 'address', 'mask', 'data')
-    messages = ('Get', 'PutFullData', 'PutPartialData', 'ArithmeticData', \
-                'LogicalData', 'Intent', 'ProbeBlock', 'ProbePerm')
-
-    def __init__(self, message, **kwargs):
-        assert message in self.messages, \
-            '{} is not in tlBMessages'.format(message)
 
+    def __init__(self):
         for attr in self.__slots__:
             setattr(self, attr, 0)
 
-        if message == 'Get':
-            self.opcode = GET
-            self.param = 0
-
-        elif message == 'PutFullData':
-            self.opcode = PUT_FULL_DATA
-            self.param = 0
-            self.data = kwargs['data']
-
-        elif message == 'PutPartialData':
-            self.opcode = PUT_PARTIAL_DATA
-            self.param = 0
-            self.data = kwargs['data']
-
-        elif message == 'ArithmeticData':
-            self.opcode = ARITHMETIC_DATA
-            self.param = kwargs['param']
-            self.data = kwargs['data']
-
-        elif message == 'LogicalData':
-            self.opcode = LOGICAL_DATA
-            self.param = kwargs['param']
-            self.data = kwargs['data']
-
-        elif message == 'Intent':
-            self.opcode = INTENT
-            self.param = kwargs['param']
-
-        elif message == 'ProbeBlock':
-            self.opcode = PROBE_BLOCK
-            self.param = kwargs['param']
-
-        elif message == 'ProbePerm':
-            self.opcode = PROBE_PERM
-            self.param = kwargs['param']
-
-        self.size = kwargs['size']
-        self.source = kwargs['source']
-        self.address = kwargs['address']
-        self.mask = kwargs['mask']
-
 class Queue():
-    def __init__(self):
-        self.queue = queue.Queue()
+    record = None
 
-    def clear(self):
-        while not self.queue.empty():
-            self.queue.get()
+    def __init__(self):
+        self.queue = deque()
+        self.pool = []
 
-    def push(self, message, **kwargs):
-        raise NotImplementedError()
+    def new_record(self):
+        if self.pool:
+            return self.pool.pop()
+        return self.record()
 
-    def check_msg(self, message):
-        raise NotImplementedError()
+    def free(self, record):
+        self.pool.append(record)
 
-    def push_msgs(self, messages):
-        for msg in messages:
-            self.check_msg(msg)
-            self.queue.put((msg, None))
+    def clear(self):
+        for (record, callback) in self.queue:
+            if record: self.free(record)
+        self.queue.clear()
 
-    def push_msg_cbs(self, msgs, cbs):
-        assert len(msgs) == len(cbs), \
-            'push_msg_cbs the number of msgs and cbs should be same'
-        for (msg, cb) in zip(msgs, cbs):
-            self.check_msg(msg)
-            self.queue.put((msg, cb))
+    def push_bubble(self):
+        self.queue.append((None, None))
 
     def pop(self):
-        return self.queue.get()
+        return self.queue.popleft()
 
     def empty(self):
-        return self.queue.empty()
+        return not self.queue
 
 class tlDQueue(Queue):
-    def __init__(self):
-        super().__init__()
-
-    def push(self, message, callback, **kwargs):
-        if message == 'Bubble':
-            self.queue.put((None, None))
-        else:
-            entry = (tlDMessage(message, **kwargs), callback)
-            self.queue.put(entry)
-
-    def check_msg(self, message):
-        assert message.__class__.__name__ == 'tlDMessage', \
-            '{} is not DMessage'.format(message)
+    record = tlDMessage
+
+    def push(self, opcode, callback, param=0, size=0, source=0, sink=0, data=0):
+        msg = self.new_record()
+        msg.opcode = opcode
+        msg.param = param
+        msg.size = size
+        msg.source = source
+        msg.sink = sink
+        msg.data = data
+        msg.corrupt = 0
+        msg.denied = 0
+
+        self.queue.append((msg, callback))
+
+    # One beat per word, callback runs with the first beat
+    def push_burst(self, opcode, callback, words, param=0, size=0, source=0, sink=0):
+        entries = []
+        for data in words:
+            msg = self.new_record()
+            msg.opcode = opcode
+            msg.param = param
+            msg.size = size
+            msg.source = source
+            msg.sink = sink
+            msg.data = data
+            msg.corrupt = 0
+            msg.denied = 0
+
+            entries.append((msg, callback))
+            callback = None
+
+        self.queue.extend(entries)
 
 class tlBQueue(Queue):
-    def __init__(self):
-        super().__init__()
-
-    def push(self, message, **kwargs):
-        if message == 'Bubble':
-            self.queue.put(None)
-        else:
-            self.queue.put(tlBMessage(message, **kwargs))
-
-    def check_msg(self, message):
-        assert message.__class__.__name__ == 'tlBMessage', \
-            '{} is not DMessage'.format(message)
-
+    record = tlBMessage
+
+    def push(self, opcode, param=0, size=0, source=0, address=0, mask=0, data=0):
+        msg = self.new_record()
+        msg.opcode = opcode
+        msg.param = param
+        msg.size = size
+        msg.source = source
+        msg.address = address
+        msg.mask = mask
+        msg.data = data
+
+        self.queue.append((msg, None))
+
+""" Free list of source/sink ids
+get/release are O(1), a taken id is swapped with the last free one.
+get picks a random free id. A seed given to reset draws them from a
+random.Random of that seed, so a test replayed with the same seed hands
+out ids in the same order.
+"""
 class FreeList():
     def __init__(self, name, init_list):
         self.name = name
         self.init_list = init_list
-        self.free_list = init_list.copy()
-        self.event_queue = queue.Queue()
+        self.init_set = set(init_list)
+        self.rng = random
+        self.event_queue = deque()
+
+        self.reset()
+
+    def reset(self, seed=None):
+        self.free_list = self.init_list.copy()
+        self.free_pos = { ret: i for (i, ret) in enumerate(self.free_list) }
+        self.event_queue.clear()
+
+        if seed is None: self.rng = random
+        else: self.rng = random.Random(seed)
 
     def get(self):
         assert self.free_list, \
             '{} is empty'.format(self.name)
 
-        ret = random.choice(self.free_list)
+        idx = self.rng.randrange(len(self.free_list))
 
-        self.free_list.remove(ret)
+        ret = self.free_list[idx]
+        last = self.free_list.pop()
+        if last != ret:
+            self.free_list[idx] = last
+            self.free_pos[last] = idx
+        del self.free_pos[ret]
 
         return ret
 
     def empty(self):
-        return not bool(self.free_list)
+        return not self.free_list
 
     def reserve(self, callback):
-        self.event_queue.put(callback)
+        self.event_queue.append(callback)
 
     def release(self, ret):
-        assert ret in self.init_list, \
+        assert ret in self.init_set, \
             '{} not in {} init_list'.format(ret, self.name)
-        assert ret not in self.free_list, \
+        assert ret not in self.free_pos, \
             '{} already in {} free_list'.format(ret, self.name)
 
+        self.free_pos[ret] = len(self.free_list)
         self.free_list.append(ret)
 
-        if not self.event_queue.empty():
-            event = self.event_queue.get()
+        if self.event_queue:
+            event = self.event_queue.popleft()
             event.call()
 
         return
@@ -267,6 +239,9 @@ class srcToCallback():
         self.name = name
         self.srcs = init_srcs
         self.c_map = {}
+        self.reset()
+
+    def reset(self):
         for src in self.srcs:
             self.c_map[src] = None
 
@@ -0,0 +1,149 @@
+from array import array
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT
+PAGE_MASK = PAGE_SIZE - 1
+PAGE_WORDS = PAGE_SIZE // 8
+
+""" pageMemory
+Sparse 64-bit word memory, a drop-in for the {addr: word} dict the RTL
+host and tilelink adapter used to share.
+
+Memory is allocated in 4KB pages of array('Q'), each with a bytearray
+marking the words which were set (a key of the old dict). A read of an
+unset word returns 0 from the zeroed page, which is the adapter's nop data.
+"""
+class pageMemory():
+    def __init__(self):
+        self.pages = {} # page number -> array('Q') of PAGE_WORDS words
+        self.valid = {} # page number -> bytearray, 1 for the words that are set
+
+    def get_page(self, num):
+        page = self.pages.get(num)
+        if page is None:
+            page = array('Q', bytes(PAGE_SIZE))
+            self.pages[num] = page
+            self.valid[num] = bytearray(PAGE_WORDS)
+
+        return (page, self.valid[num])
+
+    def __setitem__(self, addr, word):
+        (page, valid) = self.get_page(addr >> PAGE_SHIFT)
+        idx = (addr & PAGE_MASK) >> 3
+        page[idx] = word
+        valid[idx] = 1
+
+    def __getitem__(self, addr):
+        num = addr >> PAGE_SHIFT
+        idx = (addr & PAGE_MASK) >> 3
+        valid = self.valid.get(num)
+        if valid is None or not valid[idx]:
+            raise KeyError(addr)
+
+        return self.pages[num][idx]
+
+    def __contains__(self, addr):
+        valid = self.valid.get(addr >> PAGE_SHIFT)
+        return valid is not None and valid[(addr & PAGE_MASK) >> 3] == 1
+
+    def get(self, addr, default=None):
+        if addr in self:
+            return self[addr]
+        return default
+
+    def update(self, words):
+        for (addr, word) in words.items():
+            self[addr] = word
+
+    def keys(self):
+        for num in sorted(self.pages.keys()):
+            valid = self.valid[num]
+            base = num << PAGE_SHIFT
+            for idx in range(PAGE_WORDS):
+                if valid[idx]:
+                    yield base + (idx << 3)
+
+    def keys_below(self, limit):
+        addrs = []
+        for num in self.pages.keys():
+            if (num << PAGE_SHIFT) >= limit:
+                continue
+
+            valid = self.valid[num]
+            base = num << PAGE_SHIFT
+            addrs += [ base + (idx << 3) for idx in range(PAGE_WORDS) \
+                       if valid[idx] and base + (idx << 3) < limit ]
+
+        return addrs
+
+    def blocks(self, block_size):
+        block_words = block_size >> 3
+        addrs = []
+        for num in self.pages.keys():
+            valid = self.valid[num]
+            base = num << PAGE_SHIFT
+            for idx in range(0, PAGE_WORDS, block_words):
+                if valid.find(1, idx, idx + block_words) >= 0:
+                    addrs.append(base + (idx << 3))
+
+        return addrs
+
+    # Copy little endian bytes in, the words they touch are set
+    def load(self, addr, data):
+        data = memoryview(data).cast('B')
+        while data:
+            offset = addr & PAGE_MASK
+            length = min(PAGE_SIZE - offset, len(data))
+
+            (page, valid) = self.get_page(addr >> PAGE_SHIFT)
+            memoryview(page).cast('B')[offset:offset + length] = data[:length]
+
+            lo = offset >> 3
+            hi = (offset + length + 7) >> 3
+            valid[lo:hi] = b'\x01' * (hi - lo)
+
+            addr += length
+            data = data[length:]
+
+    def fill(self, start, end, word=0):
+        for num in range(start >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1):
+            (page, valid) = self.get_page(num)
+            base = num << PAGE_SHIFT
+            lo = (max(start, base) & PAGE_MASK) >> 3
+            hi = ((min(end, base + PAGE_SIZE) - base) + 7) >> 3
+
+            page[lo:hi] = array('Q', [ word ]) * (hi - lo)
+            valid[lo:hi] = b'\x01' * (hi - lo)
+
+    # Little endian bytes of [addr, addr + length), unset words read as 0
+    def read(self, addr, length):
+        chunks = []
+        while length > 0:
+            offset = addr & PAGE_MASK
+            size = min(PAGE_SIZE - offset, length)
+
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            if page is None: chunks.append(bytes(size))
+            else: chunks.append(memoryview(page).cast('B')[offset:offset + size].tobytes())
+
+            addr += size
+            length -= size
+
+        return b''.join(chunks)
+
+    # Words of a burst, the words read are set as the old dict did with nop data
+    def read_words(self, addr, num_words):
+        idx = (addr & PAGE_MASK) >> 3
+        if idx + num_words <= PAGE_WORDS:
+            (page, valid) = self.get_page(addr >> PAGE_SHIFT)
+            valid[idx:idx + num_words] = b'\x01' * num_words
+            return page[idx:idx + num_words].tolist()
+
+        words = []
+        for i in range(num_words):
+            word_addr = addr + (i << 3)
+            if word_addr not in self:
+                self[word_addr] = 0
+            words.append(self[word_addr])
+
+        return words
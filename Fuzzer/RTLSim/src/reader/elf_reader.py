@@ -0,0 +1,98 @@
+import os
+import struct
+
+from memory.page_memory import pageMemory
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+
+PT_LOAD = 1
+SHT_SYMTAB = 2
+SHN_UNDEF = 0
+STT_SECTION = 3
+STT_FILE = 4
+
+""" elfReader
+Parse a linked RV64 ELF in place of elf2hex and nm.
+
+The PT_LOAD segments are loaded at their physical address into a
+pageMemory image, and the symbol table is returned as a name -> address
+dict, the same symbols `nm` lists.
+"""
+class elfReader():
+    def __init__(self, elf_name):
+        if not os.path.isfile(elf_name):
+            raise Exception('No file exists: {}'.format(elf_name))
+
+        fd = open(elf_name, 'rb')
+        self.elf = fd.read()
+        fd.close()
+
+        if self.elf[0:4] != ELF_MAGIC or self.elf[4] != ELFCLASS64 or \
+           self.elf[5] != ELFDATA2LSB:
+            raise Exception('{} is not a little endian ELF64 file'.format(elf_name))
+
+        (self.phoff, self.shoff) = struct.unpack_from('<QQ', self.elf, 0x20)
+        (self.phentsize, self.phnum, self.shentsize, self.shnum) = \
+            struct.unpack_from('<HHHH', self.elf, 0x36)
+
+    def get_sections(self):
+        sections = []
+        for i in range(self.shnum):
+            # (name, type, flags, addr, offset, size, link, info, addralign, entsize)
+            sections.append(struct.unpack_from('<IIQQQQIIQQ', self.elf,
+                                               self.shoff + i * self.shentsize))
+        return sections
+
+    # (vaddr, offset, filesz) of the PT_LOAD segments
+    def get_segments(self):
+        segments = []
+        for i in range(self.phnum):
+            (p_type, p_flags, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_align) = \
+                struct.unpack_from('<IIQQQQQQ', self.elf, self.phoff + i * self.phentsize)
+
+            if p_type == PT_LOAD:
+                segments.append((p_vaddr, p_offset, p_filesz))
+
+        return segments
+
+    def get_image(self):
+        image = pageMemory()
+        for i in range(self.phnum):
+            (p_type, p_flags, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_align) = \
+                struct.unpack_from('<IIQQQQQQ', self.elf, self.phoff + i * self.phentsize)
+
+            if p_type != PT_LOAD or not p_memsz:
+                continue
+
+            # The .bss part of the segment is zero filled
+            image.load(p_paddr, self.elf[p_offset:p_offset + p_filesz])
+            if p_memsz > p_filesz:
+                image.load(p_paddr + p_filesz, bytes(p_memsz - p_filesz))
+
+        return image
+
+    def get_symbols(self):
+        symbols = {}
+        sections = self.get_sections()
+        for section in sections:
+            if section[1] != SHT_SYMTAB:
+                continue
+
+            (sym_offset, sym_size, strtab, entsize) = \
+                (section[4], section[5], sections[section[6]][4], section[9])
+
+            for off in range(sym_offset, sym_offset + sym_size, entsize):
+                (st_name, st_info, st_other, st_shndx, st_value, st_size) = \
+                    struct.unpack_from('<IBBHQQ', self.elf, off)
+
+                if not st_name or st_shndx == SHN_UNDEF or \
+                   (st_info & 0xf) in [ STT_SECTION, STT_FILE ]:
+                    continue
+
+                name_end = self.elf.index(b'\x00', strtab + st_name)
+                name = self.elf[strtab + st_name:name_end].decode()
+                symbols[name] = st_value
+
+        return symbols
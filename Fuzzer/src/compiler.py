@@ -0,0 +1,110 @@
+import os
+import subprocess
+
+""" rvCompiler
+Compile backend of rvPreProcessor.
+
+Template sources do not change while fuzzing, so each template is run
+through the C preprocessor only once and the result is kept in memory.
+A test is then built from the cached template lines with the fuzz bodies
+spliced in, and assembled/linked by calling as/ld directly instead of
+going through the gcc driver (cpp, as, collect2, ld).
+
+The v-u template links C sources; string.c is compiled once into an
+object, vm.c still needs gcc since ENTROPY changes per test.
+"""
+class rvCompiler():
+    def __init__(self, cc, template='Template', out_base='.', proc_num=0):
+        self.cc = cc
+        self.template = template
+        self.base = out_base
+        self.proc_num = proc_num
+
+        prefix = cc[:-len('gcc')]
+        self.asm = prefix + 'as'
+        self.ld = prefix + 'ld'
+
+        self.march = [ '-march=rv64g', '-mabi=lp64' ]
+        self.cpp_args = [ cc ] + self.march + \
+            [ '-E', '-P', '-I', '{}/include'.format(template) ]
+        self.cc_args = [ cc ] + self.march + \
+            [ '-static', '-mcmodel=medany', '-fvisibility=hidden',
+              '-nostdlib', '-nostartfiles',
+              '-I', '{}/include'.format(template),
+              '-T', '{}/include/link.ld'.format(template) ]
+        self.asm_args = [ self.asm ] + self.march
+        self.ld_args = [ self.ld, '-static', '-nostdlib',
+                         '-T', '{}/include/link.ld'.format(template) ]
+
+        self.templates = {} # (name, intr) -> preprocessed template lines
+        self.objects = {}   # source -> compiled object
+
+    def call(self, args):
+        ret = -1
+        while True:
+            ret = subprocess.call(args)
+            # if ret == -9: process is killed by OS due to memory usage
+            if ret != -9: break
+
+        return ret
+
+    def env_args(self, virtual):
+        if virtual:
+            return [ '-I', '{}/include/v'.format(self.template) ]
+        return [ '-I', '{}/include/p'.format(self.template) ]
+
+    def get_template(self, name, virtual, intr):
+        key = (name, intr)
+        if key in self.templates.keys():
+            return self.templates[key]
+
+        test_template = self.template + '/rv64-{}.S'.format(name)
+        pre_name = self.base + '/.template_{}_{}.s'.format(self.proc_num, name)
+
+        if intr: DINTR = ['-DINTERRUPT']
+        else: DINTR = []
+
+        args = self.cpp_args + DINTR + self.env_args(virtual) + \
+            [ test_template, '-o', pre_name ]
+
+        assert self.call(args) == 0, \
+            'Preprocessing {} failed'.format(test_template)
+
+        fd = open(pre_name, 'r')
+        lines = fd.readlines()
+        fd.close()
+        os.remove(pre_name)
+
+        self.templates[key] = lines
+        return lines
+
+    def get_object(self, source):
+        if source in self.objects.keys():
+            return self.objects[source]
+
+        obj_name = self.base + '/.{}_{}.o'.format(os.path.basename(source), self.proc_num)
+        args = self.cc_args + [ '-std=gnu99', '-O2', '-c', source, '-o', obj_name ]
+
+        assert self.call(args) == 0, \
+            'Compiling {} failed'.format(source)
+
+        self.objects[source] = obj_name
+        return obj_name
+
+    def compile(self, asm_name, elf_name, virtual=False, entropy=0):
+        if virtual:
+            string_obj = self.get_object('{}/include/v/string.c'.format(self.template))
+            cc_args = self.cc_args + self.env_args(virtual) + \
+                [ '-DENTROPY=0x{:08x}'.format(entropy), '-std=gnu99', '-O2',
+                  string_obj, '{}/include/v/vm.c'.format(self.template),
+                  '-x', 'assembler', asm_name, '-o', elf_name ]
+
+            return self.call(cc_args)
+
+        obj_name = elf_name[:-len('.elf')] + '.o'
+
+        ret = self.call(self.asm_args + [ asm_name, '-o', obj_name ])
+        if ret != 0:
+            return ret
+
+        return self.call(self.ld_args + [ obj_name, '-o', elf_name ])
@@ -0,0 +1,280 @@
+import re
+import struct
+
+from word import PREFIX, MAIN, SUFFIX
+
+""" Fuzz part slots
+A prelinked template reserves a fixed size slot at each _fuzz_* label,
+the encoded part is patched at its start and ends with a jump to the end
+of the slot, where the template code continues.
+"""
+slots = {
+    PREFIX: ('_fuzz_prefix', 0x100),
+    MAIN: ('_fuzz_main', 0x2000),
+    SUFFIX: ('_fuzz_suffix', 0x100)
+}
+
+rounding_modes = { 'rne': 0, 'rtz': 1, 'rdn': 2, 'rup': 3, 'rmm': 4, 'dyn': 7 }
+
+loads = [ 'lb', 'lh', 'lw', 'ld', 'lbu', 'lhu', 'lwu', 'flw', 'fld', 'flq' ]
+stores = [ 'sb', 'sh', 'sw', 'sd', 'fsw', 'fsd', 'fsq' ]
+branches = [ 'beq', 'bne', 'blt', 'bge', 'bltu', 'bgeu' ]
+shifts = { 'slli': 64, 'srli': 64, 'srai': 64, 'slliw': 32, 'srliw': 32, 'sraiw': 32 }
+imm_ops = [ 'addi', 'slti', 'sltiu', 'xori', 'ori', 'andi', 'addiw' ]
+csr_ops = [ 'csrrw', 'csrrs', 'csrrc' ]
+csr_imm_ops = [ 'csrrwi', 'csrrsi', 'csrrci' ]
+
+# fence without operands is fence iorw, iorw
+FENCE_IORW = 0x0ff00000
+
+class encodeError(Exception):
+    pass
+
+""" rvEncoder
+Encodes populated Words into RV64G machine code in place of as/ld.
+
+MATCH/MASK of the instructions and the CSR numbers are read from the
+template's encoding.h. Labels of a fuzz part are resolved against the slot
+the part is patched into and other symbols against the prelinked template.
+la is expanded to auipc/addi as gas does for the (non PIC) medany model.
+Anything it can not encode raises encodeError, the caller then falls back
+to the toolchain.
+"""
+class rvEncoder():
+    def __init__(self, template='Template'):
+        fd = open('{}/include/encoding.h'.format(template), 'r')
+        header = fd.read()
+        fd.close()
+
+        self.matches = {}
+        self.masks = {}
+        for (kind, name, val) in re.findall(r'#define (MATCH|MASK)_(\w+)\s+(0x[0-9a-f]+)', header):
+            opcode = name.lower().replace('_', '.')
+            if kind == 'MATCH': self.matches[opcode] = int(val, 16)
+            else: self.masks[opcode] = int(val, 16)
+
+        self.csrs = {}
+        for (name, val) in re.findall(r'#define CSR_(\w+)\s+(0x[0-9a-f]+)', header):
+            self.csrs[name.lower()] = int(val, 16)
+
+    def reg(self, field, prefix):
+        if field == 'zero' and prefix == 'x':
+            return 0
+
+        if field[:1] == prefix and field[1:].isdigit() and int(field[1:]) < 32:
+            return int(field[1:])
+
+        raise encodeError('{} is not a {} register'.format(field, prefix))
+
+    def xreg(self, field):
+        return self.reg(field, 'x')
+
+    def freg(self, field):
+        return self.reg(field, 'f')
+
+    def any_reg(self, field):
+        if field[:1] == 'f':
+            return self.freg(field)
+        return self.xreg(field)
+
+    def imm(self, field, low, high):
+        try:
+            val = int(field, 0)
+        except ValueError:
+            raise encodeError('{} is not an immediate'.format(field))
+
+        if val < low or val > high:
+            raise encodeError('{} is out of range [{}, {}]'.format(val, low, high))
+
+        return val
+
+    # imm(reg) operand of loads, stores and jalr
+    def mem(self, field):
+        if field[-1:] != ')' or '(' not in field:
+            raise encodeError('{} is not a memory operand'.format(field))
+
+        (offset, reg) = field[:-1].split('(')
+        return (self.imm(offset or '0', -2048, 2047), self.xreg(reg))
+
+    def match(self, opcode):
+        if opcode not in self.matches.keys():
+            raise encodeError('{} has no encoding'.format(opcode))
+        return self.matches[opcode]
+
+    def i_type(self, match, rd, rs1, imm):
+        return match | (rd << 7) | (rs1 << 15) | ((imm & 0xfff) << 20)
+
+    def s_type(self, match, rs1, rs2, imm):
+        return match | ((imm & 0x1f) << 7) | (rs1 << 15) | (rs2 << 20) | \
+            (((imm >> 5) & 0x7f) << 25)
+
+    def b_type(self, match, rs1, rs2, offset):
+        if offset & 1 or offset < -4096 or offset > 4094:
+            raise encodeError('Branch offset {} is out of range'.format(offset))
+
+        return match | (rs1 << 15) | (rs2 << 20) | \
+            (((offset >> 11) & 0x1) << 7) | (((offset >> 1) & 0xf) << 8) | \
+            (((offset >> 5) & 0x3f) << 25) | (((offset >> 12) & 0x1) << 31)
+
+    def j_type(self, match, rd, offset):
+        if offset & 1 or offset < -(1 << 20) or offset >= (1 << 20):
+            raise encodeError('Jump offset {} is out of range'.format(offset))
+
+        return match | (rd << 7) | (((offset >> 12) & 0xff) << 12) | \
+            (((offset >> 11) & 0x1) << 20) | (((offset >> 1) & 0x3ff) << 21) | \
+            (((offset >> 20) & 0x1) << 31)
+
+    def encode_inst(self, opcode, fields, pc, addr):
+        n = len(fields)
+
+        if opcode == 'la' and n == 2:
+            rd = self.xreg(fields[0])
+            offset = addr(fields[1]) - pc
+            hi = (offset + 0x800) >> 12
+            lo = offset - (hi << 12)
+            if hi < -(1 << 19) or hi >= (1 << 19):
+                raise encodeError('la offset {} is out of range'.format(offset))
+
+            return [ self.match('auipc') | (rd << 7) | ((hi & 0xfffff) << 12),
+                     self.i_type(self.match('addi'), rd, rd, lo) ]
+
+        if opcode == 'li' and n == 2:
+            return [ self.i_type(self.match('addi'), self.xreg(fields[0]), 0,
+                                 self.imm(fields[1], -2048, 2047)) ]
+
+        if opcode == 'nop' and n == 0:
+            return [ self.match('addi') ]
+
+        match = self.match(opcode)
+
+        if n == 0:
+            if opcode == 'fence':
+                return [ match | FENCE_IORW ]
+            return [ match ]
+
+        if opcode in loads and n == 2:
+            (imm, rs1) = self.mem(fields[1])
+            return [ self.i_type(match, self.any_reg(fields[0]), rs1, imm) ]
+
+        if opcode in stores and n == 2:
+            (imm, rs1) = self.mem(fields[1])
+            return [ self.s_type(match, rs1, self.any_reg(fields[0]), imm) ]
+
+        if opcode == 'jalr' and n == 2:
+            (imm, rs1) = self.mem(fields[1])
+            return [ self.i_type(match, self.xreg(fields[0]), rs1, imm) ]
+
+        if opcode in branches and n == 3:
+            return [ self.b_type(match, self.xreg(fields[0]), self.xreg(fields[1]),
+                                 addr(fields[2]) - pc) ]
+
+        if opcode == 'jal' and n == 2:
+            return [ self.j_type(match, self.xreg(fields[0]), addr(fields[1]) - pc) ]
+
+        if opcode in [ 'lui', 'auipc' ] and n == 2:
+            return [ match | (self.xreg(fields[0]) << 7) |
+                     (self.imm(fields[1], 0, 0xfffff) << 12) ]
+
+        if opcode in shifts.keys() and n == 3:
+            shamt = self.imm(fields[2], 0, shifts[opcode] - 1)
+            return [ match | (self.xreg(fields[0]) << 7) | (self.xreg(fields[1]) << 15) |
+                     (shamt << 20) ]
+
+        if opcode in imm_ops and n == 3:
+            return [ self.i_type(match, self.xreg(fields[0]), self.xreg(fields[1]),
+                                 self.imm(fields[2], -2048, 2047)) ]
+
+        if opcode in csr_ops + csr_imm_ops and n == 3:
+            if fields[1] not in self.csrs.keys():
+                raise encodeError('{} is not a CSR'.format(fields[1]))
+
+            if opcode in csr_ops: src = self.xreg(fields[2])
+            else: src = self.imm(fields[2], 0, 31)
+
+            return [ match | (self.xreg(fields[0]) << 7) | (src << 15) |
+                     (self.csrs[fields[1]] << 20) ]
+
+        if opcode == 'sfence.vma' and n == 2:
+            return [ match | (self.xreg(fields[0]) << 15) | (self.xreg(fields[1]) << 20) ]
+
+        # Atomics, rd, rs2, (rs1) or rd, (rs1) for lr
+        if fields[-1][:1] == '(' and fields[-1][-1:] == ')':
+            rs1 = self.xreg(fields[-1][1:-1])
+            rs2 = self.xreg(fields[1]) if n == 3 else 0
+            return [ match | (self.xreg(fields[0]) << 7) | (rs1 << 15) | (rs2 << 20) ]
+
+        # Register operands (rd, rs1, rs2, rs3) with an optional rounding mode
+        rm = None
+        if fields[-1] in rounding_modes.keys():
+            rm = rounding_modes[fields[-1]]
+            fields = fields[:-1]
+
+        if (self.masks.get(opcode, ~0) >> 12) & 0x7 == 0:
+            match |= (7 if rm is None else rm) << 12
+        elif rm is not None:
+            raise encodeError('{} has no rounding mode'.format(opcode))
+
+        if len(fields) < 2 or len(fields) > 4:
+            raise encodeError('Can not encode {} {}'.format(opcode, fields))
+
+        inst = match
+        for (reg, shift) in zip(fields, [ 7, 15, 20, 27 ]):
+            inst |= self.any_reg(reg) << shift
+
+        return [ inst ]
+
+    def encode_part(self, part, words, base, end, symbols):
+        # Word labels, the end label follows the last word
+        labels = {}
+        pc = base
+        for word in words:
+            labels[word.label] = pc
+            for (opcode, fields, ref, text) in word.ops:
+                pc += 8 if opcode == 'la' else 4
+        labels[len(words)] = pc
+
+        if pc + 4 > end:
+            raise encodeError('Fuzz part {} does not fit in its slot'.format(part))
+
+        def addr(field):
+            if isinstance(field, int):
+                if field not in labels.keys():
+                    raise encodeError('No label {}{}'.format(part, field))
+                return labels[field]
+
+            if field not in symbols.keys():
+                raise encodeError('No symbol {}'.format(field))
+            return symbols[field]
+
+        code = []
+        pc = base
+        for word in words:
+            for (opcode, fields, ref, text) in word.ops:
+                insts = self.encode_inst(opcode, fields, pc, addr)
+                code += insts
+                pc += 4 * len(insts)
+
+        code += [ self.j_type(self.match('jal'), 0, end - pc) ]
+
+        return struct.pack('<{}I'.format(len(code)), *code)
+
+    # Returns (address, bytes) to patch into the prelinked template
+    def encode(self, sim_input, data, symbols, num_data_sections=6):
+        patches = []
+        for (part, words) in zip([PREFIX, MAIN, SUFFIX],
+                                 [sim_input.prefix, sim_input.words, sim_input.suffix]):
+            (label, size) = slots[part]
+            if label not in symbols.keys():
+                continue
+
+            base = symbols[label]
+            patches.append((base, self.encode_part(part, words, base, base + size, symbols)))
+
+        section_size = len(data) // num_data_sections
+        for n in range(num_data_sections):
+            start = n * section_size
+            patches.append((symbols['_random_data{}'.format(n)],
+                            struct.pack('<{}Q'.format(section_size),
+                                        *data[start:start + section_size])))
+
+        return patches
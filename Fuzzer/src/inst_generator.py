@@ -4,6 +4,30 @@ import random
 from riscv_definitions import *
 from word import *
 
+""" usedSet
+Values already drawn for the current input, with O(1) insertion of a new
+value and O(1) uniform choice among them.
+"""
+class usedSet():
+    def __init__(self):
+        self.vals = []
+        self.idxes = {}
+
+    def __len__(self):
+        return len(self.vals)
+
+    def __contains__(self, val):
+        return val in self.idxes
+
+    def add(self, val):
+        if val not in self.idxes:
+            self.idxes[val] = len(self.vals)
+            self.vals.append(val)
+
+    def choice(self):
+        return self.vals[int(random.random() * len(self.vals))]
+
+
 """ rvInstGenerator
 Generates syntactically, semantically desirable unit of instructions
 
@@ -43,6 +67,17 @@ class rvInstGenerator():
             self.opcodes_map.update(rv_opcodes[isa])
 
         self.opcodes = list(self.opcodes_map.keys())
+        self.prefix_opcodes = list(rv_zicsr.keys())
+
+        # Word builder of each opcode, the first matching entry of opcodes_words
+        self.word_builders = {}
+        for (key, (key_opcodes, key_word)) in opcodes_words.items():
+            for opcode in key_opcodes:
+                self.word_builders.setdefault(opcode, key_word)
+
+        self.word_specs = {}
+        for (opcode, spec) in self.opcodes_map.items():
+            self.word_specs[opcode] = spec + (self.word_builders.get(opcode),)
 
         self.prefix_num = 0
         self.main_num = 0
@@ -51,9 +86,9 @@ class rvInstGenerator():
         self.xNums = [ i for i in range(32) ]
         self.fNums = [ i for i in range(32) ]
 
-        self.used_xNums = set([])
-        self.used_fNums = set([])
-        self.used_imms = set([])
+        self.used_xNums = usedSet()
+        self.used_fNums = usedSet()
+        self.used_imms = usedSet()
 
 
     def extend(self, isas):
@@ -70,31 +105,54 @@ class rvInstGenerator():
         self.main_num = 0
         self.suffix_num = 0
 
-        self.used_xNums = set([])
-        self.used_fNums = set([])
-        self.used_imms = set([])
+        self.used_xNums = usedSet()
+        self.used_fNums = usedSet()
+        self.used_imms = usedSet()
 
-    def _get_xregs(self, region=(0, 31), no_zero=False, thres=0.2):
-        if region == (0, 31) and len(self.used_xNums) > 0 and random.random() < thres:
-            xNum = random.choice(list(self.used_xNums))
-        else:
-            xNum = random.choice(self.xNums[region[0]:region[1]])
-            used_xNums = list(self.used_xNums) + [ xNum ]
-            self.used_xNums = set(used_xNums)
+    # Registers of num operands, the fresh ones are drawn at once
+    def _get_xreg_list(self, num, region=(0, 31), no_zero=False, thres=0.2):
+        if num == 0:
+            return []
 
-        if no_zero and xNum == 0:
-            xNum = random.choice(list(self.xNums)[1:])
+        reuse = region == (0, 31)
+        fresh = random.choices(self.xNums[region[0]:region[1]], k=num)
 
-        return 'x' + str(xNum)
+        xregs = []
+        for xNum in fresh:
+            if reuse and len(self.used_xNums) > 0 and random.random() < thres:
+                xNum = self.used_xNums.choice()
+            else:
+                self.used_xNums.add(xNum)
+
+            if no_zero and xNum == 0:
+                xNum = random.choice(self.xNums[1:])
+
+            xregs.append('x' + str(xNum))
+
+        return xregs
+
+    def _get_freg_list(self, num, thres=0.2):
+        if num == 0:
+            return []
+
+        fresh = random.choices(self.fNums, k=num)
+
+        fregs = []
+        for fNum in fresh:
+            if len(self.used_fNums) > 0 and random.random() < thres:
+                fNum = self.used_fNums.choice()
+            else:
+                self.used_fNums.add(fNum)
+
+            fregs.append('f' + str(fNum))
+
+        return fregs
+
+    def _get_xregs(self, region=(0, 31), no_zero=False, thres=0.2):
+        return self._get_xreg_list(1, region, no_zero, thres)[0]
 
     def _get_fregs(self, thres=0.2):
-        if len(self.used_fNums) > 0 and random.random() < thres:
-            fNum = random.choice(list(self.used_fNums))
-        else:
-            fNum = random.choice(self.fNums)
-            used_fNums = list(self.used_fNums) + [ fNum ]
-            self.used_fNums = set(used_fNums)
-        return 'f' + str(fNum)
+        return self._get_freg_list(1, thres)[0]
 
     def _get_imm(self, iName, align, thres=0.2, zfthres=0.2, alignthres=1):
         assert align & (align - 1) == 0, 'align must be power of 2'
@@ -117,15 +175,14 @@ class rvInstGenerator():
 
         rand = random.random()
         if len(self.used_imms) > 0 and rand < thres:
-            imm = random.choice(list(self.used_imms))
+            imm = self.used_imms.choice()
             return sign + str(mask & imm)
         elif rand < thres + zfthres:
             imm = random.choice([ 0x0, 0xffffffff ])
             return sign + str(mask & imm)
         else:
             imm = random.randint(0, mask)
-            used_imms = list(self.used_imms) + [ imm ]
-            self.used_imms = set(used_imms)
+            self.used_imms.add(imm)
             return sign + str(mask & imm)
 
     def _get_symbol(self, tpe, my_label, max_label, part):
@@ -152,42 +209,42 @@ class rvInstGenerator():
 
         return symbol
 
+    def build_word(self, opcode, label_num):
+        (syntax, xregs, fregs, imms, symbols, builder) = self.word_specs[opcode]
+        xregs = list(xregs)
+        fregs = list(fregs)
+        imms = list(imms)
+        symbols = list(symbols)
+
+        if builder:
+            (tpe, insts) = builder(opcode, syntax, xregs, fregs, imms, symbols)
+        else:
+            (tpe, insts) = (NONE, [ syntax ])
+
+        return Word(label_num, insts, tpe, xregs, fregs, imms, symbols)
+
     """ Word
     Set of instructions which forms compilable, forward-guaranteeing sequence.
     """
     def get_word(self, part):
+        return self.get_words(part, 1)[0]
+
+    # Opcodes of the num words are drawn at once
+    def get_words(self, part, num):
         if part == PREFIX:
-            opcode = random.choice(list(rv_zicsr.keys()))
+            opcodes = random.choices(self.prefix_opcodes, k=num)
             label_num = self.prefix_num
-            self.prefix_num += 1
+            self.prefix_num += num
         elif part == MAIN:
-            opcode = random.choice(self.opcodes)
+            opcodes = random.choices(self.opcodes, k=num)
             label_num = self.main_num
-            self.main_num += 1
+            self.main_num += num
         else: # SUFFIX
-            opcode = random.choice(self.opcodes)
+            opcodes = random.choices(self.opcodes, k=num)
             label_num = self.suffix_num
-            self.suffix_num += 1
+            self.suffix_num += num
 
-        (syntax, xregs, fregs, imms, symbols) = self.opcodes_map.get(opcode)
-        xregs = list(xregs)
-        fregs = list(fregs)
-        imms = list(imms)
-        symbols = list(symbols)
-
-        tpe = NONE
-        insts = [ syntax ]
-
-        for (key, tup) in opcodes_words.items():
-            key_opcodes = tup[0]
-            key_word = tup[1]
-            if opcode in key_opcodes:
-                (tpe, insts) = key_word(opcode, syntax, xregs, fregs, imms, symbols)
-                break
-
-        word = Word(label_num, insts, tpe, xregs, fregs, imms, symbols)
-
-        return word
+        return [ self.build_word(opcode, label_num + i) for (i, opcode) in enumerate(opcodes) ]
 
     def populate_word(self, word: Word, max_label: int, part: str):
         if word.populated:
@@ -198,14 +255,13 @@ class rvInstGenerator():
             region = (10, 15)
         opvals = {}
 
-        for xreg in word.xregs:
-            if word.tpe == NONE:
-                opvals[xreg] = self._get_xregs()
-            else:
-                opvals[xreg] = self._get_xregs(region, True)
+        if word.tpe == NONE:
+            xregs = self._get_xreg_list(len(word.xregs))
+        else:
+            xregs = self._get_xreg_list(len(word.xregs), region, True)
+        opvals.update(zip(word.xregs, xregs))
 
-        for freg in word.fregs:
-            opvals[freg] = self._get_fregs()
+        opvals.update(zip(word.fregs, self._get_freg_list(len(word.fregs))))
 
         for (imm, align) in word.imms:
             opvals[imm] = self._get_imm(imm, align)
@@ -1,5 +1,7 @@
 import os
 import random
+import select
+import struct
 import time
 import sysv_ipc as ipc
 import cocotb
@@ -14,6 +16,21 @@ ERR_ISA_TIMEOUT = 3
 ERR_RTL_SIM     = 4
 ERR_SI_READ     = 5
 
+""" Global coverage bitmap in shared memory
+The number of maps, then one (name length, offset, size) entry followed
+by the name per coverage map file. Entries are added by the first worker
+storing the map, the header grows from the start of the segment and the
+maps are placed from its end, so any number of maps fits as long as the
+total does.
+"""
+COV_SHM_SIZE    = 1 << 24
+COV_NUM         = struct.Struct('<I')
+COV_ENTRY       = struct.Struct('<HII')
+
+# Workers check new local coverage against the global bitmap at most once
+# per COV_MERGE_PERIOD iterations, in between they decide locally
+COV_MERGE_PERIOD = 100
+
 class procState():
     def __init__(self):
         self.NORMAL = NORMAL
@@ -35,6 +52,60 @@ class procState():
 
 proc_state = procState()
 
+""" workerChannel
+Pipes between the coordinator and a persistent worker. The worker reports
+its state at the end of each batch and blocks until the coordinator tells
+it to run another batch or to stop. EOF on the report pipe means the worker
+has died.
+"""
+class workerChannel():
+    def __init__(self):
+        (self.report_r, self.report_w) = os.pipe()
+        (self.cmd_r, self.cmd_w) = os.pipe()
+
+    def worker_side(self):
+        os.close(self.report_r)
+        os.close(self.cmd_w)
+
+    def coordinator_side(self):
+        os.close(self.report_w)
+        os.close(self.cmd_r)
+
+    def close(self):
+        os.close(self.report_r)
+        os.close(self.cmd_w)
+
+    # Worker
+    def report(self, state):
+        os.write(self.report_w, state.to_bytes(1, 'little'))
+
+    def next_batch(self):
+        cmd = os.read(self.cmd_r, 1)
+        return cmd == b'\x01'
+
+    # Coordinator
+    def recv(self):
+        state = os.read(self.report_r, 1)
+        if not state:
+            return None
+        return state[0]
+
+    def send(self, run):
+        try:
+            os.write(self.cmd_w, b'\x01' if run else b'\x00')
+        except BrokenPipeError:
+            # The worker has already exited
+            pass
+
+
+# Coordinator, returns the workers which reported or died
+def wait_channels(channels: dict):
+    fds = { channel.report_r: proc_num for (proc_num, channel) in channels.items() }
+    (ready, _, _) = select.select(list(fds.keys()), [], [])
+
+    return [ fds[fd] for fd in ready ]
+
+
 class procManager():
     def __init__(self, multicore: int, out: str, date: str):
         random.seed(time.time())
@@ -52,9 +123,14 @@ class procManager():
         self.mNum_sem = None
         self.cNum_sem = None
         self.covMap_sem = None
+        self.covMap_shm = None
         self.proc_states = None
         self.state_sem = None
 
+        # Per worker, the map offsets and the local maps merged so far
+        self.cov_entries = {}
+        self.merged_maps = {}
+
         while True:
             try:
                 key = random.randint(0, 0xffffffff)
@@ -65,12 +141,16 @@ class procManager():
                 self.covMap_sem = ipc.Semaphore(key+4, ipc.IPC_CREX, 0x01b4, 1)
                 self.proc_states = ipc.SharedMemory(key+5, ipc.IPC_CREX, 0x01b4, ipc.PAGE_SIZE)
                 self.state_sem = ipc.Semaphore(key+6, ipc.IPC_CREX, 0x01b4, 1)
+                self.covMap_shm = ipc.SharedMemory(key+7, ipc.IPC_CREX, 0x01b4, COV_SHM_SIZE)
             except ipc.ExistentialError:
                 self.delete_ipc(self.cNum_shm)
                 self.delete_ipc(self.mNum_shm)
                 self.delete_ipc(self.cNum_sem)
                 self.delete_ipc(self.mNum_sem)
                 self.delete_ipc(self.covMap_sem)
+                self.delete_ipc(self.proc_states)
+                self.delete_ipc(self.state_sem)
+                self.delete_ipc(self.covMap_shm)
             else:
                 break
 
@@ -111,8 +191,21 @@ class procManager():
         self.mNum_sem.remove()
         self.cNum_sem.remove()
         self.covMap_sem.remove()
+        self.covMap_shm.remove()
         self.proc_states.remove()
+        self.state_sem.remove()
+
+
+    # Start iteration and coverage for a new batch, from the global log
+    def read_cov_log(self):
+        self.covMap_sem.P()
+        fd = open(self.cov_log, 'r')
+        lines = fd.readlines()
+        fd.close()
+        self.covMap_sem.V()
 
+        last_tuple = lines[-1].split('\t')
+        return (int(last_tuple[1]), int(last_tuple[2]))
 
     def read_num(self, name):
         assert name in ['mNum', 'cNum'], '{} is not mNum/cNum'
@@ -146,35 +239,102 @@ class procManager():
         sem = getattr(self, name + '_sem')
         sem.V()
 
-    def store_covmap(self, proc_num, start_time, start_iter, num_iter):
-        self.covMap_sem.P()
-        cov_sum = 0
-        cov_files = []
-        covmaps = os.listdir(self.out + '/covmap-{:02}'.format(proc_num))
-
-        for cov_file in covmaps:
-            cov_map = [ 0 for i in
-                        range(os.path.getsize(self.out + '/covmap-{:02}/{}'.
-                                              format(proc_num, cov_file)))]
+    # Called with covMap_sem held, entries never move once added
+    def get_cov_offsets(self, cov_sizes):
+        if cov_sizes and all([ cov_file in self.cov_entries for cov_file in cov_sizes ]):
+            return self.cov_entries
+
+        num = COV_NUM.unpack(self.covMap_shm.read(COV_NUM.size, 0))[0]
+        entries = {}
+        pos = COV_NUM.size
+        low = COV_SHM_SIZE
+        for i in range(num):
+            (name_len, offset, size) = COV_ENTRY.unpack(self.covMap_shm.read(COV_ENTRY.size, pos))
+            name = self.covMap_shm.read(name_len, pos + COV_ENTRY.size).decode()
+            entries[name] = (offset, size)
+            pos = pos + COV_ENTRY.size + name_len
+            low = offset
+
+        for (cov_file, size) in cov_sizes.items():
+            if cov_file in entries.keys():
+                continue
+
+            name = cov_file.encode()
+            offset = low - size
+            assert pos + COV_ENTRY.size + len(name) <= offset, \
+                '{} coverage maps ({} bytes) do not fit in covMap_shm ({} bytes)'. \
+                format(num + 1, COV_SHM_SIZE - offset, COV_SHM_SIZE)
+
+            self.covMap_shm.write(COV_ENTRY.pack(len(name), offset, size) + name, pos)
+
+            # Start from the coverage saved by an earlier run
             if os.path.isfile(self.out + '/covmap/{}'.format(cov_file)):
-                fd = open(self.out + '/covmap/{}'.format(cov_file), 'r')
-                line = fd.readline()
+                fd = open(self.out + '/covmap/{}'.format(cov_file), 'rb')
+                self.covMap_shm.write(fd.read(size), offset)
                 fd.close()
 
-                for n in range(len(cov_map)):
-                    cov_map[n] = int(line[n])
-
-            fd = open(self.out + '/covmap-{:02}/{}'.format(proc_num, cov_file), 'r')
-            line = fd.readline()
+            entries[cov_file] = (offset, size)
+            pos = pos + COV_ENTRY.size + len(name)
+            low = offset
+            num = num + 1
+
+        self.covMap_shm.write(COV_NUM.pack(num), 0)
+        self.cov_entries = entries
+        return entries
+
+    # OR the maps stored by cov_store into the global bitmap,
+    # returns the number of bits no worker had covered
+    def merge_covmap(self, proc_num):
+        # Local maps only grow, only the bits set since the last merge can
+        # be new and they are found before taking covMap_sem
+        cov_sizes = {}
+        new_bits = {}
+        for cov_file in os.listdir(self.out + '/covmap-{:02}'.format(proc_num)):
+            fd = open(self.out + '/covmap-{:02}/{}'.format(proc_num, cov_file), 'rb')
+            cov_bytes = fd.read()
             fd.close()
 
-            for n in range(len(cov_map)):
-                cov_map[n] = cov_map[n] | int(line[n])
-                cov_sum = cov_sum + cov_map[n]
+            cov_sizes[cov_file] = len(cov_bytes)
+            (last_bytes, last_map) = self.merged_maps.get(cov_file, (None, 0))
+            if cov_bytes == last_bytes:
+                continue
+
+            cov_map = int.from_bytes(cov_bytes, 'little')
+            new_bits[cov_file] = cov_map & ~last_map
+            self.merged_maps[cov_file] = (cov_bytes, cov_map)
+
+        self.covMap_sem.P()
+        entries = self.get_cov_offsets(cov_sizes)
+
+        new_cov = 0
+        for (cov_file, bits) in new_bits.items():
+            if not bits:
+                continue
+
+            (offset, size) = entries[cov_file]
+            global_map = int.from_bytes(self.covMap_shm.read(size, offset), 'little')
+
+            new_map = bits & ~global_map
+            if new_map:
+                new_cov = new_cov + bin(new_map).count('1')
+                self.covMap_shm.write((global_map | bits).to_bytes(size, 'little'), offset)
+        self.covMap_sem.V()
+
+        return new_cov
+
+    def store_covmap(self, proc_num, start_time, start_iter, num_iter):
+        self.merge_covmap(proc_num)
+
+        # Coverage maps are packed bitmaps, saved from the global one
+        self.covMap_sem.P()
+        cov_sum = 0
+        entries = self.get_cov_offsets({})
+        for (cov_file, (offset, size)) in entries.items():
+            cov_bytes = self.covMap_shm.read(size, offset)
+            cov_sum = cov_sum + bin(int.from_bytes(cov_bytes, 'little')).count('1')
 
-            cov_string = ''.join(str(e) for e in cov_map)
-            fd = open(self.out + '/covmap/{}'.format(cov_file), 'w')
-            fd.write(cov_string)
+            fd = open(self.out + '/covmap/{}'.format(cov_file), 'wb')
+            fd.write(cov_bytes)
             fd.close()
 
         elapsed_time = time.time() - start_time
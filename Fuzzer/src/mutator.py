@@ -1,6 +1,7 @@
 import os
 import random
-from copy import deepcopy
+import struct
+import hashlib
 
 from inst_generator import Word, rvInstGenerator, PREFIX, MAIN, SUFFIX
 
@@ -21,6 +22,41 @@ V_U = 3
 templates = [ 'p-m', 'p-s', 'p-u',
               'v-u']
 
+""" Corpus index
+Append-only, one line per corpus entry -- id, template and the hash of
+the saved simInput. Workers tail it from the byte offset they have read
+up to, so only new entries are parsed.
+"""
+def corpus_index(corpus_dir):
+    return corpus_dir + '_index'
+
+""" Binary simInput
+The header (SI_HEADER) is followed by the words of each part, a label and
+the instructions as length prefixed strings, then the interrupt bits of
+each main instruction, and the data words. Text simInputs start with the
+template name, so SI_MAGIC tells them apart.
+"""
+SI_MAGIC  = b'\x7fSIB'
+SI_HEADER = struct.Struct('<4sBHHHI')
+SI_WORD   = struct.Struct('<HB')
+
+# Single pass over the lines of a text simInput (after the template),
+# yields (part, label, line) per instruction line where label is None
+# except on the first line of a word, then (None, None, word) per data word
+def parse_si(lines):
+    part = None
+    for line in lines:
+        head = line[:2]
+        if head in [ PREFIX, MAIN, SUFFIX ]:
+            part = head
+            yield (part, int(line[2:8].split(':')[0]), line)
+        elif 'data:' in line:
+            for word in lines:
+                yield (None, None, word)
+            return
+        else:
+            yield (part, None, line)
+
 class simInput():
     def __init__(self, prefix: list, words: list, suffix: list, ints: list, data_seed: int, template: int):
         self.prefix = prefix
@@ -35,28 +71,56 @@ class simInput():
         self.data_seed = data_seed
         self.template = template
 
+    def save_bin(self, name, data=[]):
+        content = [ SI_HEADER.pack(SI_MAGIC, self.template, self.num_prefix,
+                                   self.num_words, self.num_suffix, len(data)) ]
+
+        k = 0
+        for (part, target) in zip([PREFIX, MAIN, SUFFIX], [self.prefix, self.words, self.suffix]):
+            for word in target:
+                insts = [ inst[8:50].rstrip().encode() for inst in word.get_insts() ]
+
+                content.append(SI_WORD.pack(word.label, len(insts)))
+                for inst in insts:
+                    content.append(bytes([len(inst)]) + inst)
+
+                if part == MAIN:
+                    ints = self.ints[k:k + len(insts)]
+                    content.append(bytes(ints + [0] * (len(insts) - len(ints))))
+                    k += len(insts)
+
+        content.append(struct.pack('<{}Q'.format(len(data)), *data))
+        content = b''.join(content)
+
+        fd = open(name, 'wb')
+        fd.write(content)
+        fd.close()
+
+        return content
+
     def save(self, name, data=[]):
         prefix_insts = self.get_prefix()
         insts = self.get_insts()
         suffix_insts = self.get_suffix()
 
-        fd = open(name, 'w')
-        fd.write('{}\n\n'.format(templates[self.template]))
+        lines = [ '{}\n\n'.format(templates[self.template]) ]
 
         for inst in prefix_insts[:-1]:
-            fd.write('{:<50}\n'.format(inst))
+            lines.append('{:<50}\n'.format(inst))
 
         for (inst, INT) in zip(insts, self.ints):
-            fd.write('{:<50}{:04b}\n'.format(inst, INT))
+            lines.append('{:<50}{:04b}\n'.format(inst, INT))
 
         for inst in suffix_insts[:-1]:
-            fd.write('{:<50}\n'.format(inst))
+            lines.append('{:<50}\n'.format(inst))
 
         if data:
-            fd.write('data:\n')
+            lines.append('data:\n')
             for word in data:
-                fd.write('{:016x}\n'.format(word))
+                lines.append('{:016x}\n'.format(word))
 
+        fd = open(name, 'w')
+        fd.write(''.join(lines))
         fd.close()
 
     def get_seed(self):
@@ -94,6 +158,8 @@ class rvMutator():
     def __init__(self, max_data_seeds=100, corpus_size=1000, no_guide=False):
         self.corpus_size = corpus_size
         self.corpus = []
+        self.corpus_pos = 0
+        self.corpus_hashes = set()
 
         self.phases = [GENERATION, MUTATION, MERGE]
         self.phase = GENERATION
@@ -134,22 +200,10 @@ class rvMutator():
         self.data_seeds.pop(idx)
         self.data_seeds.append(seed)
 
-    def read_label(self, line, tuples):
-        label = line[:8].split(':')[0]
-        label_num = int(label[2:])
-
-        insts = []
-        tuples.append((label_num, insts))
-
-        return tuples
-
     def tuples_to_words(self, tuples, part):
         words = []
 
-        for tup in tuples:
-            label = tup[0]
-            insts = tup[1]
-
+        for (label, insts) in tuples:
             word = Word(label, insts)
             word.populate({}, part)
 
@@ -157,70 +211,69 @@ class rvMutator():
 
         return words
 
-    def read_siminput(self, si_name):
-        fd = open(si_name, 'r')
-        lines = fd.readlines()
-        fd.close()
-
+    def read_text_si(self, lines):
+        tuples = { PREFIX: [], MAIN: [], SUFFIX: [] }
         ints = []
-        prefix_tuples = []
-        word_tuples = []
-        suffix_tuples = []
         data = []
 
-        num_prefix = 0
-        num_word = 0
-        num_suffix = 0
-
-        part = None
-        tmp_tuples = None
-        num_tmp = None
-
-        template_word = lines.pop(0).split('\n')[0]
-        template = templates.index(template_word)
-        lines.pop(0)
-        while True:
-            try: line = lines.pop(0)
-            except: break
-
-            if 'data:' in line:
-                part = None
-                while True:
-                    try: word = lines.pop(0)
-                    except: break
-
-                    data.append(int(word, 16))
-                break
-            elif line[:2] == PREFIX:
-                part = PREFIX
-                num_prefix += 1
-                tmp_tuples = self.read_label(line, prefix_tuples)
-                num_tmp = num_prefix
-
-                tmp_tuples[num_tmp - 1][1].append(line[8:50])
-            elif line[:2] == MAIN:
-                part = MAIN
-                num_word += 1
-                tmp_tuples = self.read_label(line, word_tuples)
-                num_tmp = num_word
-               
-                tmp_tuples[num_tmp - 1][1].append(line[8:50])
-            elif line[:2] == SUFFIX:
-                part = SUFFIX
-                num_suffix += 1
-                tmp_tuples = self.read_label(line, suffix_tuples)
-                num_tmp = num_suffix
-
-                tmp_tuples[num_tmp - 1][1].append(line[8:50])
-            else:
-                tmp_tuples[num_tmp - 1][1].append(line[8:50])
+        template = templates.index(next(lines).split('\n')[0])
+        next(lines)
+        for (part, label, line) in parse_si(lines):
+            if part is None:
+                data.append(int(line, 16))
+                continue
+
+            if label is not None:
+                tuples[part].append((label, []))
+            tuples[part][-1][1].append(line[8:50])
 
             if part == MAIN:
                 ints.append(int(line[-5:-1], 2))
 
-        prefix = self.tuples_to_words(prefix_tuples, PREFIX)
-        words = self.tuples_to_words(word_tuples, MAIN)
-        suffix = self.tuples_to_words(suffix_tuples, SUFFIX)
+        return (template, tuples, ints, data)
+
+    def read_bin_si(self, content):
+        (_, template, num_prefix, num_word, num_suffix, num_data) = \
+            SI_HEADER.unpack_from(content, 0)
+        pos = SI_HEADER.size
+
+        tuples = { PREFIX: [], MAIN: [], SUFFIX: [] }
+        ints = []
+        for (part, num) in zip([PREFIX, MAIN, SUFFIX], [num_prefix, num_word, num_suffix]):
+            for i in range(num):
+                (label, len_insts) = SI_WORD.unpack_from(content, pos)
+                pos += SI_WORD.size
+
+                insts = []
+                for j in range(len_insts):
+                    length = content[pos]
+                    insts.append('{:<42}'.format(content[pos + 1:pos + 1 + length].decode()))
+                    pos += 1 + length
+
+                if part == MAIN:
+                    ints += list(content[pos:pos + len_insts])
+                    pos += len_insts
+
+                tuples[part].append((label, insts))
+
+        data = list(struct.unpack_from('<{}Q'.format(num_data), content, pos))
+
+        return (template, tuples, ints, data)
+
+    def read_siminput(self, si_name):
+        fd = open(si_name, 'rb')
+        content = fd.read()
+        fd.close()
+
+        if content[:len(SI_MAGIC)] == SI_MAGIC:
+            (template, tuples, ints, data) = self.read_bin_si(content)
+        else:
+            lines = iter(content.decode().splitlines(True))
+            (template, tuples, ints, data) = self.read_text_si(lines)
+
+        prefix = self.tuples_to_words(tuples[PREFIX], PREFIX)
+        words = self.tuples_to_words(tuples[MAIN], MAIN)
+        suffix = self.tuples_to_words(tuples[SUFFIX], SUFFIX)
 
         data_seed = self.add_data(data)
         sim_input = simInput(prefix, words, suffix, ints, data_seed, template)
@@ -291,8 +344,7 @@ class rvMutator():
             tmps = []
             for word in target:
                 if word.insts != ['nop']:
-                    new_word = deepcopy(word)
-                    tmps.append(new_word)
+                    tmps.append(word)
 
                 if part == MAIN:
                     if word.insts != ['nop']:
@@ -307,34 +359,67 @@ class rvMutator():
 
         return (del_input, data)
 
+    def save_corpus(self, corpus_dir, num, sim_input):
+        # The corpus is only read back by the fuzzer, keep it binary
+        content = sim_input.save_bin(corpus_dir + '/id_{}.si'.format(num))
+        digest = hashlib.sha1(content).hexdigest()
+        self.corpus_hashes.add(digest)
+
+        # A single O_APPEND write, lines of workers do not interleave
+        line = '{} {} {}\n'.format(num, templates[sim_input.template], digest)
+        fd = os.open(corpus_index(corpus_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+        os.write(fd, line.encode())
+        os.close(fd)
+
     def update_corpus(self, corpus_dir, update_num=100):
-        si_files = os.listdir(corpus_dir)
+        index = corpus_index(corpus_dir)
+        if not os.path.isfile(index):
+            return
+
+        fd = open(index, 'rb')
+        fd.seek(self.corpus_pos)
+        lines = fd.readlines()
+        fd.close()
+
+        # The last line can still be being written
+        if lines and not lines[-1].endswith(b'\n'):
+            lines.pop()
+        self.corpus_pos += sum([ len(line) for line in lines ])
+
+        entries = []
+        for line in lines:
+            fields = line.decode(errors='replace').split()
+            if len(fields) != 3 or not fields[0].isdigit() or \
+               fields[1] not in templates or len(fields[2]) != 40:
+                print('[DifuzzRTL] Malformed corpus index line -- {}'.format(line))
+                continue
 
-        num_files = len(si_files)
-        start = max(num_files - update_num, 0)
-        for i in range(start, num_files):
+            (num, template, digest) = fields
+            if digest not in self.corpus_hashes:
+                self.corpus_hashes.add(digest)
+                entries.append(int(num))
+
+        for num in entries[-update_num:]:
+            si_name = corpus_dir + '/id_{}.si'.format(num)
             try:
-                (sim_input, _) = self.read_siminput(corpus_dir +
-                                                    '/id_{}.si'.format(i))
-                self.add_corpus(sim_input)
-            except:
+                (sim_input, _, _) = self.read_siminput(si_name)
+            except (OSError, ValueError, struct.error) as e:
+                print('[DifuzzRTL] Can not read corpus {} -- {}'.format(si_name, e))
                 continue
 
-    def reset_labels(self, words, part):
-        n = 0
+            self.add_corpus(sim_input)
 
+    def reset_labels(self, words, part):
         label_map = {}
+        new_words = []
         for (n, word) in enumerate(words):
-            tup = word.reset_label(n, part)
-            if tup:
-                label_map[tup[0]] = tup[1]
+            if word.populated:
+                label_map[word.label] = n
+            new_words.append(word.relabel(n, part))
 
         max_label = len(words)
 
-        for word in words:
-            word.repop_label(label_map, max_label, part)
-
-        return words
+        return [ word.repop(label_map, max_label, part) for word in new_words ]
 
     def mutate_words(self, seed_words, part, max_num):
         words = []
@@ -364,22 +449,17 @@ class rvMutator():
         data_seed = -1
         template = -1
         if self.phase == GENERATION:
-            for n in range(self.num_prefix):
-                word = self.inst_generator.get_word(PREFIX)
-                prefix.append(word)
-            for n in range(self.num_words):
-                word = self.inst_generator.get_word(MAIN)
-                words.append(word)
-            for n in range(self.num_suffix):
-                word = self.inst_generator.get_word(SUFFIX)
-                suffix.append(word)
+            prefix = self.inst_generator.get_words(PREFIX, self.num_prefix)
+            words = self.inst_generator.get_words(MAIN, self.num_words)
+            suffix = self.inst_generator.get_words(SUFFIX, self.num_suffix)
 
         elif self.phase in [ MUTATION, MERGE ]:
             if self.phase == MUTATION:
                 seed_si = random.choice(self.corpus)
-                seed_prefix = deepcopy(seed_si.prefix)
-                seed_words = deepcopy(seed_si.words)
-                seed_suffix = deepcopy(seed_si.suffix)
+                # Words are copy on write, the seed's ones are shared
+                seed_prefix = seed_si.prefix
+                seed_words = seed_si.words
+                seed_suffix = seed_si.suffix
                 data_seed = seed_si.get_seed()
                 template = seed_si.get_template()
             else:
@@ -387,10 +467,10 @@ class rvMutator():
                 seed_si1 = random.choice(self.corpus)
                 seed_si2 = random.choice(self.corpus)
 
-                seed_prefix = deepcopy(seed_si1.prefix)
-                si1_words = deepcopy(seed_si1.words)
-                si2_words = deepcopy(seed_si2.words)
-                seed_suffix = deepcopy(seed_si1.suffix)
+                seed_prefix = seed_si1.prefix
+                si1_words = seed_si1.words
+                si2_words = seed_si2.words
+                seed_suffix = seed_si1.suffix
                 idx = random.randint(0, min(len(si1_words),
                                             len(si2_words)))
 
@@ -1,45 +1,42 @@
 import os
-import subprocess
 import shutil
 import random
 
 from ISASim.host import isaInput
 from RTLSim.host import rtlInput
+from reader.elf_reader import elfReader
 from mutator import simInput, templates, P_M, P_S, P_U, V_U
-
+from word import PREFIX, MAIN, SUFFIX
+from compiler import rvCompiler
+from encoder import rvEncoder, encodeError, slots
+
+def input_name(base, proc_num, ext, slot=0):
+    if slot:
+        return base + '/.input_{}_{}.{}'.format(proc_num, slot, ext)
+    return base + '/.input_{}.{}'.format(proc_num, ext)
+
+""" rvPreProcessor
+Builds the ISA/RTL simulation inputs of a simInput.
+
+Except for the v-u template (vm.c is rebuilt per test), the fuzz parts are
+encoded by rvEncoder and patched into a template prelinked once with an
+empty slot per part, so no toolchain runs per test. Inputs the encoder can
+not handle go through the assembler as before.
+"""
 class rvPreProcessor():
-    def __init__(self, cc, elf2hex, template='Template', out_base ='.', proc_num=0):
+    def __init__(self, cc, template='Template', out_base ='.', proc_num=0, encode=True):
         self.cc = cc
-        self.elf2hex = elf2hex
         self.template = template
         self.base = out_base
         self.proc_num = proc_num
 
         self.er_num = 0
-        self.cc_args = [ cc, '-march=rv64g', '-mabi=lp64', '-static', '-mcmodel=medany',
-                         '-fvisibility=hidden', '-nostdlib', '-nostartfiles',
-                         '-I', '{}/include'.format(template),
-                         '-T', '{}/include/link.ld'.format(template) ]
-
-        self.elf2hex_args = [ elf2hex, '--bit-width', '64', '--input' ]
-
-    def get_symbols(self, elf_name, sym_name):
-        # symbol_file = self.base + '/.input.symbols'
-        fd = open(sym_name, 'w')
-        subprocess.call([ 'nm', elf_name], stdout=fd )
-        fd.close()
-
-        symbols = {}
-        fd = open(sym_name, 'r')
-        lines = fd.readlines()
-        fd.close()
-
-        for line in lines:
-            symbol = line.split(' ')[2]
-            addr = line.split(' ')[0]
-            symbols[symbol[:-1]] = int(addr, 16)
+        self.compiler = rvCompiler(cc, template, out_base, proc_num)
 
-        return symbols
+        self.encoder = None
+        if encode:
+            self.encoder = rvEncoder(template)
+        self.prelinked = {} # (version, intr, data length) -> (elf, segments, symbols)
 
     def write_isa_intr(self, isa_input, rtl_input, epc):
         fd = open(rtl_input.intrfile, 'r')
@@ -54,54 +51,10 @@ class rvPreProcessor():
         fd.write('{:016x}:{:04b}\n'.format(epc, val))
         fd.close()
 
-    def process(self, sim_input: simInput, data: list, intr: bool, num_data_sections=6):
+    def get_assembly(self, template_lines, prefix_insts, insts, suffix_insts,
+                     data, num_data_sections):
         section_size = len(data) // num_data_sections
 
-        assert data, 'Empty data can not be processed'
-        assert (section_size & (section_size - 1)) == 0, \
-            'Number of memory blocks should be power of 2'
-
-        version = sim_input.get_template()
-        test_template = self.template + '/rv64-{}.S'.format(templates[version])
-
-        if intr: DINTR = ['-DINTERRUPT']
-        else: DINTR = []
-        extra_args = DINTR + [ '-I', '{}/include/p'.format(self.template) ]
-        if version in [ V_U ]:
-            rand = data[0] & 0xffffffff
-            extra_args = DINTR + [ '-DENTROPY=0x{:08x}'.format(rand), '-std=gnu99', '-O2',
-                                   '-I', '{}/include/v'.format(self.template),
-                                   '{}/include/v/string.c'.format(self.template),
-                                   '{}/include/v/vm.c'.format(self.template) ]
-
-        si_name = self.base + '/.input_{}.si'.format(self.proc_num)
-        asm_name = self.base + '/.input_{}.S'.format(self.proc_num)
-        elf_name = self.base + '/.input_{}.elf'.format(self.proc_num)
-        hex_name = self.base + '/.input_{}.hex'.format(self.proc_num)
-        sym_name = self.base + '/.input_{}.symbols'.format(self.proc_num)
-        rtl_intr_name = self.base + '/.input_{}.rtl.intr'.format(self.proc_num)
-        isa_intr_name = self.base + '/.input_{}.isa.intr'.format(self.proc_num)
-
-        prefix_insts = sim_input.get_prefix()
-        insts = sim_input.get_insts()
-        suffix_insts = sim_input.get_suffix()
-        sim_input_ints = sim_input.ints.copy()
-
-        ints = []
-        for inst in insts[:-1]:
-            INT = sim_input_ints.pop(0)
-            if 'la' in inst:
-                ints.append(INT)
-                ints.append(0)
-            else:
-                ints.append(INT)
-
-        sim_input.save(si_name, data)
-
-        fd = open(test_template, 'r')
-        template_lines = fd.readlines()
-        fd.close()
-
         assembly = []
         for line in template_lines:
             assembly.append(line)
@@ -120,7 +73,7 @@ class rvPreProcessor():
             for n in range(num_data_sections):
                 start = n * section_size
                 end = start + section_size
-                if '_random_data{}'.format(n) in line:
+                if '_random_data{}:'.format(n) in line:
                     k = 0
                     for i in range(start, end, 2):
                         label = ''
@@ -131,24 +84,119 @@ class rvPreProcessor():
                         assembly.append('{:<16}.dword 0x{:016x}, 0x{:016x}\n'.\
                                         format(label, data[i], data[i+1]))
 
+        return assembly
+
+    # Template with an empty slot per fuzz part and zero data, linked once
+    def get_prelinked(self, version, intr, data_len, num_data_sections):
+        key = (version, intr, data_len)
+        if key in self.prelinked.keys():
+            return self.prelinked[key]
+
+        name = templates[version]
+        asm_name = self.base + '/.prelinked_{}_{}.S'.format(self.proc_num, name)
+        elf_name = self.base + '/.prelinked_{}_{}.elf'.format(self.proc_num, name)
+
+        (prefix_slot, main_slot, suffix_slot) = \
+            [ [ '.skip {}'.format(slots[part][1]) ] for part in [ PREFIX, MAIN, SUFFIX ] ]
+
+        template_lines = self.compiler.get_template(name, False, intr)
+        assembly = self.get_assembly(template_lines, prefix_slot, main_slot, suffix_slot,
+                                     [ 0 ] * data_len, num_data_sections)
+
         fd = open(asm_name, 'w')
         fd.writelines(assembly)
         fd.close()
 
-        cc_args = self.cc_args + extra_args + [ asm_name, '-o', elf_name ]
+        prelinked = None
+        if self.compiler.compile(asm_name, elf_name) == 0:
+            reader = elfReader(elf_name)
+            prelinked = (reader.elf, reader.get_segments(), reader.get_symbols())
+
+        self.prelinked[key] = prelinked
+        return prelinked
+
+    def encode(self, sim_input, data, version, intr, elf_name, num_data_sections):
+        prelinked = self.get_prelinked(version, intr, len(data), num_data_sections)
+        if not prelinked:
+            return -1
+
+        (elf, segments, symbols) = prelinked
+        try:
+            patches = self.encoder.encode(sim_input, data, symbols, num_data_sections)
+        except encodeError:
+            return -1
+
+        elf = bytearray(elf)
+        for (addr, code) in patches:
+            for (vaddr, offset, filesz) in segments:
+                if vaddr <= addr and addr + len(code) <= vaddr + filesz:
+                    elf[offset + addr - vaddr:offset + addr - vaddr + len(code)] = code
+                    break
+            else:
+                return -1
+
+        fd = open(elf_name, 'wb')
+        fd.write(elf)
+        fd.close()
+
+        return 0
+
+    def process(self, sim_input: simInput, data: list, intr: bool, num_data_sections=6, slot=0):
+        section_size = len(data) // num_data_sections
+
+        assert data, 'Empty data can not be processed'
+        assert (section_size & (section_size - 1)) == 0, \
+            'Number of memory blocks should be power of 2'
+
+        version = sim_input.get_template()
+        virtual = version in [ V_U ]
+
+        si_name = input_name(self.base, self.proc_num, 'si', slot)
+        asm_name = input_name(self.base, self.proc_num, 'S', slot)
+        elf_name = input_name(self.base, self.proc_num, 'elf', slot)
+        rtl_intr_name = input_name(self.base, self.proc_num, 'rtl.intr', slot)
+        isa_intr_name = input_name(self.base, self.proc_num, 'isa.intr', slot)
+
+        # Slot 0 signs to the ISA host's default signature file
+        isa_sig_name = None
+        if slot:
+            isa_sig_name = input_name(self.base, self.proc_num, 'isa.sig', slot)
+
+        prefix_insts = sim_input.get_prefix()
+        insts = sim_input.get_insts()
+        suffix_insts = sim_input.get_suffix()
+        sim_input_ints = sim_input.ints.copy()
+
+        ints = []
+        for inst in insts[:-1]:
+            INT = sim_input_ints.pop(0)
+            if 'la' in inst:
+                ints.append(INT)
+                ints.append(0)
+            else:
+                ints.append(INT)
+
+        sim_input.save(si_name, data)
+
+        template_lines = self.compiler.get_template(templates[version], virtual, intr)
+        assembly = self.get_assembly(template_lines, prefix_insts, insts, suffix_insts,
+                                     data, num_data_sections)
+
+        fd = open(asm_name, 'w')
+        fd.writelines(assembly)
+        fd.close()
 
         cc_ret = -1
-        while True:
-            cc_ret = subprocess.call(cc_args)
-            # if cc_ret == -9: cc process is killed by OS due to memory usage
-            if cc_ret != -9: break
+        if self.encoder and not virtual:
+            cc_ret = self.encode(sim_input, data, version, intr, elf_name, num_data_sections)
 
-        if cc_ret == 0:
-            subprocess.call(cc_args)
+        if cc_ret != 0:
+            cc_ret = self.compiler.compile(asm_name, elf_name, virtual, data[0] & 0xffffffff)
 
-            elf2hex_args = self.elf2hex_args + [ elf_name, '--output', hex_name]
-            subprocess.call(elf2hex_args)
-            symbols= self.get_symbols(elf_name, sym_name)
+        if cc_ret == 0:
+            reader = elfReader(elf_name)
+            image = reader.get_image()
+            symbols = reader.get_symbols()
 
             if intr:
                 fuzz_main = symbols['_fuzz_main']
@@ -159,11 +207,11 @@ class rvPreProcessor():
                 fd.close()
 
             max_cycles = 6000
-            if version in [ V_U ]:
+            if virtual:
                 max_cycles = 200000
 
-            isa_input = isaInput(elf_name, isa_intr_name)
-            rtl_input = rtlInput(hex_name, rtl_intr_name, data, symbols, max_cycles)
+            isa_input = isaInput(elf_name, isa_intr_name, isa_sig_name)
+            rtl_input = rtlInput(image, rtl_intr_name, data, symbols, max_cycles)
         else:
             isa_input = None
             rtl_input = None
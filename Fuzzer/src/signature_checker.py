@@ -1,11 +1,27 @@
 import os
+import struct
 
 from riscv_definitions import *
 
+""" sigChecker
+Signatures are packed little endian bytes, the signature region
+(begin_signature ~ end_signature) followed by the random data sections.
+The RTL host builds it from its memory, the ISA one is parsed from spike's
+signature file into the same layout.
+
+The word offsets of each output, read from the symbols, are cached per
+template layout. The compared words are covered by one bit mask, so a
+check is a single xor/and over the two signatures as integers.
+"""
 class sigChecker():
-    def __init__(self, isa_sigfile, rtl_sigfile, debug=False, minimizing=False):
+    def __init__(self, isa_sigfile, debug=False, minimizing=False):
         self.isa_sigfile = isa_sigfile
-        self.rtl_sigfile = rtl_sigfile
+
+        self.layout_symbols = [ 'begin_signature', 'end_signature', 'xreg_output_data',
+                                'freg_output_data', 'csr_output_data' ] + \
+            [ '_random_data{}'.format(i) for i in range(6) ] + \
+            [ '_end_data{}'.format(i) for i in range(6) ]
+        self.layouts = {}
 
         self.debug = debug
         self.minimizing = minimizing
@@ -36,62 +52,67 @@ class sigChecker():
 
         data_idx_start = (symbol_end - symbol_start) // (2 * 8)
 
-        return (xreg_idxes, freg_idxes, csr_idxes, data_symbols, data_idx_start)
+        word_mask = (1 << 64) - 1
+        mask = 0
+        for idx in xreg_idxes + freg_idxes + list(csr_idxes.values()):
+            mask |= word_mask << (64 * idx)
+
+        data_len = sum([ data_end - data_start for (data_start, data_end) in data_symbols ])
+        mask |= ((1 << (8 * data_len)) - 1) << (128 * data_idx_start)
+
+        return (xreg_idxes, freg_idxes, csr_idxes, data_symbols, data_idx_start, mask)
 
-    def read_sig(self, sigfile, xreg_idxes, freg_idxes,
-                 csr_idxes, data_symbols, data_idx_start):
+    def get_layout(self, symbols):
+        key = tuple([ symbols[name] for name in self.layout_symbols ])
+        if key not in self.layouts.keys():
+            self.layouts[key] = self.read_symbols(symbols)
 
-        fd = open(sigfile)
+        return self.layouts[key]
+
+    def read_isa_sig(self, sigfile):
+        fd = open(sigfile, 'r')
         lines = fd.readlines()
         fd.close()
 
-        xreg_vals = []
-        freg_vals = []
-        csr_vals = {}
+        # Each line holds 16 bytes, most significant byte first
+        return b''.join([ bytes.fromhex(line.strip())[::-1] for line in lines ])
+
+    def read_sig(self, sig, layout):
+        (xreg_idxes, freg_idxes, csr_idxes, data_symbols, data_idx_start, mask) = layout
 
-        for idx in xreg_idxes:
-            val = lines[idx // 2][16 - 16 * (idx % 2):32 - 16 * (idx % 2)]
-            xreg_vals.append(int(val, 16))
+        words = struct.unpack('<{}Q'.format(len(sig) // 8), sig)
 
-        for idx in freg_idxes:
-            val = lines[idx // 2][16 - 16 * (idx % 2):32 - 16 * (idx % 2)]
-            freg_vals.append(int(val, 16))
+        xreg_vals = [ words[idx] for idx in xreg_idxes ]
+        freg_vals = [ words[idx] for idx in freg_idxes ]
 
+        csr_vals = {}
         for csr_name in csr_names:
-            idx = csr_idxes[csr_name]
-            val = lines[idx // 2][16 - 16 * (idx % 2):32 - 16 * (idx % 2)]
-            csr_vals[csr_name] = int(val, 16)
+            csr_vals[csr_name] = words[csr_idxes[csr_name]]
 
         data_vals = {}
+        data_idx = data_idx_start * 2
         for i in range(6):
-            tup = data_symbols[i]
-            data_start = tup[0]
-            data_end = tup[1]
-            section_size = data_end - data_start
-
-            data = []
-            for j in range(section_size // 16):
-                words = lines[data_idx_start + j]
-                data.append(int(words[16:32], 16))
-                data.append(int(words[0:16], 16))
+            (data_start, data_end) = data_symbols[i]
+            section_len = (data_end - data_start) // 8
 
-            data_vals['data{}'.format(i)] = data
-            data_idx_start += (section_size // 16)
+            data_vals['data{}'.format(i)] = list(words[data_idx:data_idx + section_len])
+            data_idx += section_len
 
         return (xreg_vals, freg_vals, csr_vals, data_vals)
 
-    def check_intr(self, symbols):
-        (xreg_idxes, freg_idxes, csr_idxes, data_symbols, data_idx_start) = \
-            self.read_symbols(symbols)
+    def sig_match(self, isa_sig, rtl_sig, mask):
+        if len(isa_sig) != len(rtl_sig):
+            return False
 
-        (rtl_xreg_vals, rtl_freg_vals, rtl_csr_vals, rtl_data_vals) = \
-            self.read_sig(self.rtl_sigfile, xreg_idxes, freg_idxes,
-                          csr_idxes, data_symbols, data_idx_start)
+        diff = int.from_bytes(isa_sig, 'little') ^ int.from_bytes(rtl_sig, 'little')
+        return (diff & mask) == 0
 
-        scause = rtl_csr_vals['scause']
-        sepc = rtl_csr_vals['sepc']
-        mcause = rtl_csr_vals['mcause']
-        mepc = rtl_csr_vals['mepc']
+    def check_intr(self, symbols, rtl_sig):
+        csr_idxes = self.get_layout(symbols)[2]
+
+        (scause, sepc, mcause, mepc) = \
+            [ struct.unpack_from('<Q', rtl_sig, 8 * csr_idxes[csr_name])[0]
+              for csr_name in [ 'scause', 'sepc', 'mcause', 'mepc' ] ]
 
         intr_prv = NONE
         epc = 0
@@ -111,18 +132,24 @@ class sigChecker():
 
         return intr_prv, epc
 
-    def check(self, symbols):
+    def check(self, symbols, rtl_sig, isa_sigfile=None):
+        if not isa_sigfile:
+            isa_sigfile = self.isa_sigfile
+
+        layout = self.get_layout(symbols)
+        data_symbols = layout[3]
+
+        isa_sig = self.read_isa_sig(isa_sigfile)
 
-        (xreg_idxes, freg_idxes, csr_idxes, data_symbols, data_idx_start) = \
-            self.read_symbols(symbols)
+        # Values are only unpacked and compared one by one to report a mismatch
+        if not self.debug and self.sig_match(isa_sig, rtl_sig, layout[5]):
+            return True
 
         (isa_xreg_vals, isa_freg_vals, isa_csr_vals, isa_data_vals) = \
-            self.read_sig(self.isa_sigfile, xreg_idxes, freg_idxes,
-                          csr_idxes, data_symbols, data_idx_start)
+            self.read_sig(isa_sig, layout)
 
         (rtl_xreg_vals, rtl_freg_vals, rtl_csr_vals, rtl_data_vals) = \
-            self.read_sig(self.rtl_sigfile, xreg_idxes, freg_idxes,
-                          csr_idxes, data_symbols, data_idx_start)
+            self.read_sig(rtl_sig, layout)
 
         xreg_match = True
         freg_match = True
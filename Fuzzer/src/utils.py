@@ -2,19 +2,20 @@ import os
 import shutil
 import psutil
 import signal
+import random
 from threading import Timer
 
 from ISASim.host import rvISAhost
 from RTLSim.host import rvRTLhost
 
-from src.preprocessor import rvPreProcessor
+from src.preprocessor import rvPreProcessor, input_name
 from src.signature_checker import sigChecker
 from src.mutator import simInput, rvMutator
 from src.multicore_manager import proc_state, procManager
 
 ISA_TIME_LIMIT = 1
 
-def save_err(out: str, proc_num: int, manager: procManager, stop_code: int):
+def save_err(out: str, proc_num: int, manager: procManager, stop_code: int, slot=0):
 
     if stop_code == proc_state.NORMAL:
         return
@@ -30,16 +31,19 @@ def save_err(out: str, proc_num: int, manager: procManager, stop_code: int):
         os.makedirs(out + '/err')
     manager.V('state')
 
-    shutil.copyfile(out + '/.input_{}.si'.format(proc_num),
+    shutil.copyfile(input_name(out, proc_num, 'si', slot),
                     out + '/err/err_{}_{}.si'.format(status, proc_num))
 
 
-def isa_timeout(out, stop, proc_num):
+def save_isa_timeout(out, proc_num, slot=0):
     if not os.path.isdir(out + '/isa_timeout'):
         os.makedirs(out + '/isa_timeout')
 
-    shutil.copy(out + '/.input_{}.elf'.format(proc_num), out + '/isa_timeout/timeout.elf')
-    shutil.copy(out + '/.input_{}.S'.format(proc_num), out + '/isa_timeout/timeout.S')
+    shutil.copy(input_name(out, proc_num, 'elf', slot), out + '/isa_timeout/timeout.elf')
+    shutil.copy(input_name(out, proc_num, 'S', slot), out + '/isa_timeout/timeout.S')
+
+def isa_timeout(out, stop, proc_num, slot=0):
+    save_isa_timeout(out, proc_num, slot)
 
     ps = psutil.Process()
     children = ps.children(recursive=True)
@@ -49,10 +53,10 @@ def isa_timeout(out, stop, proc_num):
 
     stop[0] = proc_state.ERR_ISA_TIMEOUT
 
-def run_isa_test(isaHost, isa_input, stop, out, proc_num, assert_intr=False):
+def run_isa_test(isaHost, isa_input, stop, out, proc_num, assert_intr=False, slot=0):
     ret = proc_state.NORMAL
    
-    timer = Timer(ISA_TIME_LIMIT, isa_timeout, [out, stop, proc_num])
+    timer = Timer(ISA_TIME_LIMIT, isa_timeout, [out, stop, proc_num, slot])
     timer.start()
     isa_ret = isaHost.run_test(isa_input, assert_intr)
     timer.cancel()
@@ -66,6 +70,73 @@ def run_isa_test(isaHost, isa_input, stop, out, proc_num, assert_intr=False):
 
     return ret
 
+def run_isa_batch(isaHost, isa_inputs, out, proc_num):
+    isa_rets = isaHost.run_batch(isa_inputs, ISA_TIME_LIMIT * 1000)
+
+    rets = []
+    for (slot, isa_ret) in enumerate(isa_rets):
+        if isa_ret is None:
+            save_isa_timeout(out, proc_num, slot)
+            rets.append(proc_state.ERR_ISA_TIMEOUT)
+        elif isa_ret != 0:
+            rets.append(proc_state.ERR_ISA_ASSERT)
+        else:
+            rets.append(proc_state.NORMAL)
+
+    return rets
+
+# Generate, compile and run on the ISA simulator num inputs at once.
+# Returns (slot, sim_input, data, assert_intr, isa_input, rtl_input, symbols, isa_ret)
+# per input, in slot order. Inputs after a compile failure are
+# dropped, the failed one is returned with empty isa/rtl inputs.
+def prepare_batch(mutator, preprocessor, isaHost, num, prob_intr, out, proc_num):
+    batch = []
+    for slot in range(num):
+        assert_intr = False
+        if random.random() < prob_intr:
+            assert_intr = True
+
+        (sim_input, data) = mutator.get(assert_intr)
+        (isa_input, rtl_input, symbols) = \
+            preprocessor.process(sim_input, data, assert_intr, slot=slot)
+
+        batch.append([slot, sim_input, data, assert_intr, isa_input, rtl_input, symbols, None])
+        if not (isa_input and rtl_input):
+            break
+
+    isa_inputs = [ test[4] for test in batch if test[4] and test[5] ]
+    if isa_inputs:
+        isa_rets = run_isa_batch(isaHost, isa_inputs, out, proc_num)
+        for (test, isa_ret) in zip(batch, isa_rets):
+            test[7] = isa_ret
+
+    return [ tuple(test) for test in batch ]
+
+# Compile and run an input on the ISA simulator, used as the pipeline worker.
+# The worker has its own stop flag, the caller decides what an error means.
+def prepare_test(preprocessor, isaHost, sim_input, data, assert_intr, out, proc_num, slot):
+    (isa_input, rtl_input, symbols) = \
+        preprocessor.process(sim_input, data, assert_intr, slot=slot)
+
+    isa_ret = proc_state.NORMAL
+    if isa_input and rtl_input:
+        isa_ret = run_isa_test(isaHost, isa_input, [ proc_state.NORMAL ],
+                               out, proc_num, slot=slot)
+
+    return (isa_input, rtl_input, symbols, isa_ret)
+
+# Generate the next input and hand it to the pipeline worker.
+# Returns (slot, sim_input, data, assert_intr, future of prepare_test)
+def submit_test(executor, mutator, preprocessor, isaHost, prob_intr, out, proc_num, slot):
+    assert_intr = False
+    if random.random() < prob_intr:
+        assert_intr = True
+
+    (sim_input, data) = mutator.get(assert_intr)
+    future = executor.submit(prepare_test, preprocessor, isaHost, sim_input, data,
+                             assert_intr, out, proc_num, slot)
+
+    return (slot, sim_input, data, assert_intr, future)
 
 def debug_print(message, debug, highlight=False):
     if highlight:
@@ -78,23 +149,21 @@ def save_file(file_name, mode, line):
     fd.write(line)
     fd.close()
 
-def save_mismatch(base, proc_num, out, sim_input: simInput, data: list, num): #, elf, asm, hexfile, mNum):
+def save_mismatch(base, proc_num, out, sim_input: simInput, data: list, num, slot=0): #, elf, asm, mNum):
     sim_input.save(out + '/sim_input/id_{}.si'.format(num), data)
 
-    elf = base + '/.input_{}.elf'.format(proc_num)
-    asm = base + '/.input_{}.S'.format(proc_num)
-    hexfile = base + '/.input_{}.hex'.format(proc_num)
+    elf = input_name(base, proc_num, 'elf', slot)
+    asm = input_name(base, proc_num, 'S', slot)
 
     shutil.copy(elf, out + '/elf/id_{}.elf'.format(num))
     shutil.copy(asm, out + '/asm/id_{}.S'.format(num))
-    shutil.copy(hexfile, out + '/hex/id_{}.hex'.format(num))
 
-def setup(dut, toplevel, template, out, proc_num, debug, minimizing=False, no_guide=False):
+def setup(dut, toplevel, template, out, proc_num, debug, minimizing=False, no_guide=False,
+          tl_seed=False):
     mutator = rvMutator(no_guide=no_guide)
 
     cc = 'riscv64-unknown-elf-gcc'
-    elf2hex = 'riscv64-unknown-elf-elf2hex'
-    preprocessor = rvPreProcessor(cc, elf2hex, template, out, proc_num)
+    preprocessor = rvPreProcessor(cc, template, out, proc_num)
 
     spike = os.environ['SPIKE']
     isa_sigfile = out + '/.isa_sig_{}.txt'.format(proc_num)
@@ -103,9 +172,10 @@ def setup(dut, toplevel, template, out, proc_num, debug, minimizing=False, no_gu
     if debug: spike_arg = ['-l']
     else: spike_arg = []
 
-    isaHost = rvISAhost(spike, spike_arg, isa_sigfile)
-    rtlHost = rvRTLhost(dut, toplevel, rtl_sigfile, debug=debug)
+    isa_batchfile = out + '/.isa_batch_{}.txt'.format(proc_num)
+    isaHost = rvISAhost(spike, spike_arg, isa_sigfile, isa_batchfile)
+    rtlHost = rvRTLhost(dut, toplevel, rtl_sigfile, debug=debug, tl_seed=tl_seed)
 
-    checker = sigChecker(isa_sigfile, rtl_sigfile, debug, minimizing)
+    checker = sigChecker(isa_sigfile, debug, minimizing)
 
     return (mutator, preprocessor, isaHost, rtlHost, checker)
@@ -15,6 +15,13 @@ PREFIX = '_p'
 MAIN   = '_l'
 SUFFIX = '_s'
 
+""" Word
+Populated instructions are kept as (opcode, fields, ref, text), the operand
+fields with the placeholders substituted and ref the index of the field
+referencing a label of the same part, which is kept as an integer. text
+caches the instruction of the ones without a reference. The assembly lines
+are only formatted by get_insts.
+"""
 class Word():
     def __init__(self, label: int, insts: list, tpe=NONE, xregs=[], fregs=[], imms=[], symbols=[], populated=False):
         self.label = label
@@ -29,68 +36,102 @@ class Word():
         self.operands = xregs + fregs + [ imm[0] for imm in imms ] + symbols
 
         self.populated = populated
-        self.ret_insts = []
+        self.part = MAIN
+        self.ops = []
+
+    def pop_inst(self, inst, opvals, part):
+        (opcode, _, args) = inst.rstrip().partition(' ')
+
+        if not args:
+            return (opcode, [], -1, opcode)
+
+        fields = args.split(', ')
+        ref = -1
+        for (i, field) in enumerate(fields):
+            # Most fields are a single placeholder
+            if field in opvals:
+                field = opvals[field]
+            else:
+                for (op, val) in opvals.items():
+                    field = field.replace(op, val)
+
+            if i > 0 and ref == -1 and field[:2] == part and field[2:].isdigit():
+                ref = i
+                field = int(field[2:])
 
-    def pop_inst(self, inst, opvals):
-        for (op, val) in opvals.items():
-            inst = inst.replace(op, val)
+            fields[i] = field
 
-        return inst
+        # Lines without a label reference never change, so they are joined once
+        text = None
+        if ref == -1:
+            text = opcode + ' ' + ', '.join(fields)
+
+        return (opcode, fields, ref, text)
 
     def populate(self, opvals, part=MAIN):
         for op in self.operands:
             assert op in opvals.keys(), \
                 '{} is not in label {} Word opvals'.format(op, self.label)
 
-        pop_insts = []
-        for inst in self.insts:
-            p_inst = self.pop_inst(inst, opvals)
-            pop_insts.append(p_inst)
+        self.ops = [ self.pop_inst(inst, opvals, part) for inst in self.insts ]
+        self.part = part
+        self.populated = True
 
-        ret_insts = [ '{:<8}{:<42}'.format(part + str(self.label) + ':',
-                                           pop_insts.pop(0)) ]
+    # Populated Words are not modified in place, relabel and repop return
+    # a copy only when something changes so unchanged Words are shared
+    def copy(self, label, ops):
+        word = Word(label, self.insts, self.tpe, self.xregs, self.fregs,
+                    self.imms, self.symbols, self.populated)
+        word.part = self.part
+        word.ops = ops
 
-        for i in range(len(pop_insts)):
-            ret_insts.append('{:8}{:<42}'.format('', pop_insts.pop(0)))
+        return word
 
-        self.populated = True
-        self.ret_insts = ret_insts
+    def relabel(self, new_label, part):
+        if new_label == self.label:
+            return self
 
-    def reset_label(self, new_label, part):
-        old_label = self.label
-        self.label = new_label
+        return self.copy(new_label, self.ops)
 
-        if self.populated:
-            self.ret_insts[0] = '{:8}{:<42}'.format(part + str(self.label) + ':',
-                                                    self.ret_insts[0][8:])
-            return (old_label, new_label)
-        else:
-            return None
+    def repop(self, label_map, max_label, part):
+        if not self.populated:
+            return self
 
-    def repop_label(self, label_map, max_label, part):
-        if self.populated:
-            for i in range(len(self.ret_insts)):
-                inst = self.ret_insts[i]
-                tmps = inst.split(', ' + part)
+        ops = None
+        for (i, (opcode, fields, ref, text)) in enumerate(self.ops):
+            if ref == -1:
+                continue
 
-                if len(tmps) > 1:
-                    label = tmps[1].split(' ')[0]
+            old = fields[ref]
+            new = label_map.get(old, random.randint(self.label + 1, max_label))
 
-                    old = int(label)
-                    new = label_map.get(old, random.randint(self.label + 1, max_label))
+            if new != old:
+                if ops is None:
+                    ops = list(self.ops)
+                new_fields = list(fields)
+                new_fields[ref] = new
+                ops[i] = (opcode, new_fields, ref, None)
 
-                    new_inst = inst[8:].replace(part + '{}'.format(old), part + '{}'.format(new))
-                    inst = '{:<8}{:<50}'.format(inst[0:8], new_inst)
+        if ops is None:
+            return self
 
-                    self.ret_insts[i] = inst
-        else:
-            return
+        return self.copy(self.label, ops)
 
     def get_insts(self):
         assert self.populated, \
             'Word is not populated'
 
-        return self.ret_insts
+        label = self.part + str(self.label) + ':'
+        insts = []
+        for (opcode, fields, ref, text) in self.ops:
+            if text is None:
+                fields = fields[:ref] + [ self.part + str(fields[ref]) ] + fields[ref + 1:]
+                text = opcode + ' ' + ', '.join(fields)
+
+            insts.append('{:<8}{:<42}'.format(label, text))
+            label = ''
+
+        return insts
 
 def word_jal(opcode, syntax, xregs, fregs, imms, symbols):
     tpe = CF_J
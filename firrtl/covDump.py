@@ -34,6 +34,58 @@ def findCovPath(modInst, modCovSize, module):
     
     return covPaths
 
+""" Store/restore logic of the coverage maps
+A map is saved packed, 32 entries per word written with %u (little endian),
+so the file holds entry i in bit (i % 8) of byte (i / 8). $fread loads a
+word big endian, so the restore reads the bytes of the word in reverse.
+"""
+def writeCovStoreRestore(nfd, covPathSize):
+    nfd.write('`ifdef MULTICORE\n')
+    nfd.write('  integer i;\n')
+    nfd.write('  integer j;\n')
+    nfd.write('  integer fd;\n')
+    nfd.write('  integer c;\n')
+    nfd.write('  reg [31:0] cov_word;\n')
+    nfd.write('  reg [8*100:1] out;\n')
+    nfd.write('  initial begin\n')
+    nfd.write('    if ($value$plusargs("OUT=%s", out)) begin\n')
+    nfd.write('      $display("Output directory: %0s\\n", out);\n')
+    nfd.write('    end\n')
+    nfd.write('  end\n')
+    nfd.write('  always @(posedge clock) begin\n')
+    nfd.write('    if (cov_restore) begin\n')
+
+    for (path, size) in covPathSize:
+        if size != 0:
+            nfd.write('      fd = $fopen({out, "/covmap/%s.dat"}, "rb");\n' % path)
+            nfd.write('      if (fd == 0)\n')
+            nfd.write('        $display("No saved %s, starting from zero", "{}");\n'.format(path))
+            nfd.write('      else begin\n')
+            nfd.write('        for (i=0; i<%d; i=i+32) begin\n' % size)
+            nfd.write('          c = $fread(cov_word, fd);\n')
+            nfd.write('          for (j=0; j<32 && i+j<%d; j=j+1)\n' % size)
+            nfd.write('            %s[i+j] = cov_word[(3-j/8)*8 + j%%8];\n' % path)
+            nfd.write('        end\n')
+            nfd.write('        $fclose(fd);\n')
+            nfd.write('      end\n')
+
+    nfd.write('    end\n')
+    nfd.write('    if (cov_store) begin\n')
+
+    for (path, size) in covPathSize:
+        if size != 0:
+            nfd.write('      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/%s.dat"}, "wb");\n' % path)
+            nfd.write('      for (i=0; i<%d; i=i+32) begin\n' % size)
+            nfd.write('        cov_word = 0;\n')
+            nfd.write('        for (j=0; j<32 && i+j<%d; j=j+1)\n' % size)
+            nfd.write('          cov_word[j] = %s[i+j];\n' % path)
+            nfd.write('        $fwrite(fd, "%u", cov_word);\n')
+            nfd.write('      end\n')
+            nfd.write('      $fclose(fd);\n')
+    nfd.write('    end\n')
+    nfd.write('  end\n')
+    nfd.write('`endif\n')
+
 def main():
     parser = argparse.ArgumentParser(description='Argparser for save/restore coverage map instrument')
     
@@ -109,44 +161,7 @@ def main():
                 if ');' in inLine:
                     nfd.write(');\n')
 
-                    nfd.write('`ifdef MULTICORE\n')
-                    nfd.write('  integer i;\n')
-                    nfd.write('  integer fd;\n')
-                    nfd.write('  integer c;\n')
-                    nfd.write('  reg [8*100:1] out;\n')
-                    nfd.write('  initial begin\n')
-                    nfd.write('    if ($value$plusargs("OUT=%s", out)) begin\n')
-                    nfd.write('      $display("Output directory: %0s\\n", out);\n')
-                    nfd.write('    end\n')
-                    nfd.write('  end\n')
-                    nfd.write('  always @(posedge clock) begin\n')
-                    nfd.write('    if (cov_restore) begin\n')
-                    
-                    for (path, size) in covPathSize:
-                        if size != 0:
-                            nfd.write('      fd = $fopen({out, "/covmap/%s.dat"}, "r");\n' % path)
-                            nfd.write('      if (fd == 0)\n')
-                            nfd.write('        $display("No saved %s, starting from zero", "{}");\n'.format(path))
-                            nfd.write('      else begin\n')
-                            nfd.write('        for (i=0; i<%d; i=i+1) begin\n' % size)
-                            nfd.write('          c = $fgetc(fd);\n');
-                            nfd.write('          %s[i] = c[0];\n' % path)
-                            nfd.write('        end\n')
-                            nfd.write('        $fclose(fd);\n')
-                            nfd.write('      end\n')
-
-                    nfd.write('    end\n')
-                    nfd.write('    if (cov_store) begin\n')
-
-                    for (path, size) in covPathSize:
-                        if size != 0:
-                            nfd.write('      fd = $fopen({{{out, "/covmap-"}, `toAscii(proc_num)}, "/%s.dat"}, "w");\n' % path)
-                            nfd.write('      for (i=0; i<%d; i=i+1)\n' % size)
-                            nfd.write('        $fwrite(fd, "%0b", {}[i]);\n'.format(path))
-                            nfd.write('      $fclose(fd);\n')
-                    nfd.write('    end\n')
-                    nfd.write('  end\n')
-                    nfd.write('`endif\n')
+                    writeCovStoreRestore(nfd, covPathSize)
                     break
                 else:
                     nfd.write(inLine)
@@ -1,14 +1,5 @@
 #!/bin/bash
 
-# Install elf2hex
-git clone https://github.com/sifive/elf2hex.git
-pushd elf2hex > /dev/null
-autoreconf -i
-./configure --target=riscv64-unknown-elf
-make
-sudo make install
-popd > /dev/null
-
 # Build riscv-isa-sim
 pushd Fuzzer/ISASim/riscv-isa-sim > /dev/null
 mkdir build